@@ -0,0 +1,122 @@
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Float, Integer, cast, func
+from sqlalchemy.orm import Query, Session
+
+from listing import period_filter
+from model_registry import registry
+from models import Building, GroupBuilding, PredictionTable, Unit
+from predict import parse_model_names
+
+# สรุปผลพยากรณ์ด้วย GROUP BY ในฐานข้อมูล ส่งกลับเป็นแถวสรุปไม่กี่สิบแถวแทนแถวพยากรณ์ทั้งเดือน
+# การอ่านตามเดือนที่พยากรณ์ใช้ index ix_prediction_period (year_current, month_current, modelName)
+# อ่านเฉพาะผลของเวอร์ชันโมเดลเดียว (ค่าเริ่มต้นคือเวอร์ชันที่ใช้พยากรณ์อยู่) ไม่นับซ้ำข้ามเวอร์ชัน
+# การเทียบกับค่าจริงใช้ uq_unit_period_building (years, month, idBuilding) และกลุ่มอาคารใช้ index ของ building.idGroup
+ACCURACY_GROUPS = ("model", "month")
+
+# predictiontable.building เก็บ id อาคารเป็นข้อความ แปลงฝั่ง predictiontable เพื่อให้ค้น building/unit ด้วย index ได้
+_building_id = cast(PredictionTable.building, Integer)
+_area = cast(Building.area, Float)
+_prediction = func.sum(PredictionTable.prediction)
+# เรียง T1, T2, ..., T12 ตามลำดับ horizon ไม่ใช่ตามตัวอักษร
+_model_order = (func.length(PredictionTable.modelName), PredictionTable.modelName)
+
+
+def _per_m2(total: Optional[float], area: Optional[float]) -> Optional[float]:
+    return total / area if total is not None and area else None
+
+
+def _version(query: Query, model_version: str) -> Query:
+    return query.filter(PredictionTable.model_version == model_version)
+
+
+def _anchor(query: Query, year: int, month: int, model_name: str, model_version: str) -> Query:
+    query = _version(query, model_version)
+    query = query.filter(PredictionTable.year_current == year, PredictionTable.month_current == month)
+    if model_name != "All":
+        query = query.filter(PredictionTable.modelName.in_(parse_model_names(model_name)))
+    return query
+
+
+def campus_totals(db: Session, year: int, month: int, model_name: str = "All",
+                  model_version: Optional[str] = None) -> dict:
+    """Campus-wide predicted units per predicted month (one row per horizon)."""
+    model_version = model_version or registry.serving_version()
+    query = _anchor(
+        db.query(PredictionTable.modelName, PredictionTable.year_predict, PredictionTable.month_predict,
+                 func.count(PredictionTable.id).label("buildings"), _prediction.label("prediction")),
+        year, month, model_name, model_version,
+    ).group_by(PredictionTable.modelName, PredictionTable.year_predict, PredictionTable.month_predict) \
+        .order_by(PredictionTable.year_predict, PredictionTable.month_predict)
+    return {"year": year, "month": month, "model_version": model_version, "items": [row._asdict() for row in query]}
+
+
+def group_totals(db: Session, year: int, month: int, model_name: str = "All",
+                 model_version: Optional[str] = None) -> dict:
+    """Predicted units and units per square metre for each building group and predicted month."""
+    model_version = model_version or registry.serving_version()
+    query = _anchor(
+        db.query(Building.idGroup, GroupBuilding.name.label("group"), PredictionTable.modelName,
+                 PredictionTable.year_predict, PredictionTable.month_predict,
+                 func.count(PredictionTable.id).label("buildings"), _prediction.label("prediction"),
+                 func.sum(_area).label("area"))
+        .join(Building, Building.id == _building_id)
+        .outerjoin(GroupBuilding, GroupBuilding.id == Building.idGroup),
+        year, month, model_name, model_version,
+    ).group_by(Building.idGroup, GroupBuilding.name, PredictionTable.modelName,
+               PredictionTable.year_predict, PredictionTable.month_predict) \
+        .order_by(PredictionTable.year_predict, PredictionTable.month_predict, Building.idGroup)
+    items = []
+    for row in query:
+        item = row._asdict()
+        item["per_m2"] = _per_m2(item["prediction"], item["area"])
+        items.append(item)
+    return {"year": year, "month": month, "model_version": model_version, "items": items}
+
+
+def energy_intensity(db: Session, year: int, month: int, model_name: str = "T1",
+                     model_version: Optional[str] = None) -> dict:
+    """Predicted units per square metre of ``Building.area`` for each building, highest first."""
+    model_version = model_version or registry.serving_version()
+    per_m2 = (PredictionTable.prediction / func.nullif(_area, 0)).label("per_m2")
+    query = _anchor(
+        db.query(Building.id.label("building"), Building.code, Building.idGroup, PredictionTable.modelName,
+                 PredictionTable.year_predict, PredictionTable.month_predict, PredictionTable.prediction,
+                 _area.label("area"), per_m2)
+        .join(Building, Building.id == _building_id),
+        year, month, model_name, model_version,
+    ).order_by(per_m2.desc(), *_model_order, Building.id)
+    return {"year": year, "month": month, "model_version": model_version, "items": [row._asdict() for row in query]}
+
+
+def accuracy(db: Session, year_from: Optional[int] = None, month_from: Optional[int] = None,
+             year_to: Optional[int] = None, month_to: Optional[int] = None, model_name: str = "All",
+             by: str = "model", model_version: Optional[str] = None) -> dict:
+    """Stored predictions against the actual units of the predicted month, summed per model (and month)."""
+    if by not in ACCURACY_GROUPS:
+        raise HTTPException(status_code=400, detail=f"by must be one of {', '.join(ACCURACY_GROUPS)}")
+    model_version = model_version or registry.serving_version()
+
+    keys: List = [PredictionTable.modelName]
+    if by == "month":
+        keys += [PredictionTable.year_predict, PredictionTable.month_predict]
+    query = db.query(*keys, func.count(PredictionTable.id).label("n"), _prediction.label("prediction"),
+                     func.sum(Unit.amount).label("actual"),
+                     func.avg(func.abs(PredictionTable.prediction - Unit.amount)).label("mae")) \
+        .join(Unit, (Unit.idBuilding == _building_id) & (Unit.years == PredictionTable.year_predict)
+              & (Unit.month == PredictionTable.month_predict))
+    query = _version(query, model_version)
+    query = period_filter(query, PredictionTable.year_current, PredictionTable.month_current,
+                          year_from, month_from, year_to, month_to)
+    if model_name != "All":
+        query = query.filter(PredictionTable.modelName.in_(parse_model_names(model_name)))
+    query = query.group_by(*keys).order_by(*keys[1:], *_model_order)
+
+    items = []
+    for row in query:
+        item = row._asdict()
+        item["delta"] = item["prediction"] - item["actual"]
+        item["delta_pct"] = item["delta"] / item["actual"] * 100 if item["actual"] else None
+        items.append(item)
+    return {"by": by, "model_version": model_version, "items": items}
@@ -0,0 +1,200 @@
+import argparse
+import logging
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from bulk import insert_rows
+from features import LAG_MONTHS, FeatureHistory, YearMonth, feature_matrix, shift_month
+from models import BacktestMetric, BacktestRun
+from predict import model_horizon, parse_model_names, predict_batch
+
+logger = logging.getLogger(__name__)
+
+# จำกัดช่วงที่ทดสอบได้ในครั้งเดียว (20 ปี)
+MAX_ANCHORS = 240
+SCOPES = ("horizon", "building", "building_horizon")
+
+
+def ensure_tables(bind) -> None:
+    BacktestRun.__table__.create(bind=bind, checkfirst=True)
+    BacktestMetric.__table__.create(bind=bind, checkfirst=True)
+
+
+def _anchors(start: YearMonth, end: YearMonth) -> List[YearMonth]:
+    count = (end[0] * 12 + end[1]) - (start[0] * 12 + start[1]) + 1
+    return [shift_month(*start, i) for i in range(count)]
+
+
+def error_metrics(errors: np.ndarray, actual: np.ndarray) -> dict:
+    abs_errors = np.abs(errors)
+    nonzero = actual != 0
+    return {
+        "n": int(len(errors)),
+        "mae": float(abs_errors.mean()),
+        # เดือนที่ค่าจริงเป็น 0 ไม่นับใน MAPE
+        "mape": float((abs_errors[nonzero] / np.abs(actual[nonzero])).mean() * 100) if nonzero.any() else None,
+        "rmse": float(np.sqrt((errors ** 2).mean())),
+    }
+
+
+def evaluate(db: Session, start: YearMonth, end: YearMonth, model_names: List[str]) -> dict:
+    """Replay forecasts for every anchor month in [start, end] and score them against actual units.
+
+    Raw data for the whole range is loaded once and the feature rows of all
+    anchors are stacked into one matrix, so each model runs a single batch.
+    """
+    anchors = _anchors(start, end)
+    if not anchors:
+        raise HTTPException(status_code=400, detail="The start month must not be after the end month")
+    if len(anchors) > MAX_ANCHORS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ANCHORS} anchor months per backtest")
+
+    horizons = [model_horizon(name, i + 1) for i, name in enumerate(model_names)]
+    history = FeatureHistory.load(db, shift_month(*start, -LAG_MONTHS), shift_month(*end, max(horizons)))
+
+    rows, row_anchors = [], []
+    for anchor in anchors:
+        for building_id in history.buildings_with_unit(*anchor):
+            row = history.feature_row(building_id, *anchor)
+            if row is not None:
+                rows.append(row)
+                row_anchors.append(anchor)
+    if not rows:
+        raise HTTPException(status_code=404, detail="No buildings found for the specified period")
+
+    predictions = predict_batch(model_names, feature_matrix(rows))
+    buildings = np.array([row.building_id for row in rows])
+
+    metrics = []
+    per_building: Dict[int, list] = defaultdict(list)
+    samples = 0
+    for i, (model_name, horizon) in enumerate(zip(model_names, horizons)):
+        # ค่าจริงของเดือนเป้าหมาย (ไม่มีข้อมูล = NaN และไม่นำมาคิด)
+        actual = np.array([
+            history.units.get((*shift_month(*anchor, horizon), row.building_id))
+            for anchor, row in zip(row_anchors, rows)
+        ], dtype=np.float64)
+        valid = ~np.isnan(actual)
+        if not valid.any():
+            continue
+        errors = predictions[i][valid] - actual[valid]
+        actual = actual[valid]
+        model_buildings = buildings[valid]
+        samples += len(errors)
+
+        metrics.append({"scope": "horizon", "modelName": model_name, "building": None, **error_metrics(errors, actual)})
+        for building_id in np.unique(model_buildings):
+            selected = model_buildings == building_id
+            per_building[int(building_id)].append((errors[selected], actual[selected]))
+            metrics.append({"scope": "building_horizon", "modelName": model_name, "building": int(building_id),
+                            **error_metrics(errors[selected], actual[selected])})
+
+    for building_id in sorted(per_building):
+        errors = np.concatenate([e for e, _ in per_building[building_id]])
+        actual = np.concatenate([a for _, a in per_building[building_id]])
+        metrics.append({"scope": "building", "modelName": None, "building": building_id, **error_metrics(errors, actual)})
+
+    return {"anchors": len(anchors), "samples": samples, "metrics": metrics}
+
+
+def run_backtest(db: Session, start: YearMonth, end: YearMonth, model_name: str = "All") -> int:
+    """Evaluate, store the run and its metrics, and return the run id."""
+    model_names = parse_model_names(model_name)
+    started = time.perf_counter()
+    result = evaluate(db, start, end, model_names)
+    duration = time.perf_counter() - started
+
+    run = BacktestRun(year_from=start[0], month_from=start[1], year_to=end[0], month_to=end[1],
+                      models=",".join(model_names), anchors=result["anchors"], samples=result["samples"],
+                      duration=duration)
+    try:
+        db.add(run)
+        db.flush()
+        insert_rows(db, BacktestMetric, [{"run_id": run.id, **metric} for metric in result["metrics"]])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info("Backtest %d: %d anchors, %d samples in %.2fs", run.id, result["anchors"], result["samples"], duration)
+    return run.id
+
+
+def _run_dict(run: BacktestRun) -> dict:
+    return {
+        "run_id": run.id,
+        "year_from": run.year_from,
+        "month_from": run.month_from,
+        "year_to": run.year_to,
+        "month_to": run.month_to,
+        "models": run.models.split(","),
+        "anchors": run.anchors,
+        "samples": run.samples,
+        "duration": run.duration,
+        "created_at": run.created_at.isoformat() if run.created_at else None,
+    }
+
+
+def list_runs(db: Session, limit: int = 50) -> List[dict]:
+    return [_run_dict(run) for run in db.query(BacktestRun).order_by(BacktestRun.id.desc()).limit(limit)]
+
+
+def get_backtest(db: Session, run_id: int, scope: Optional[str] = None, building: Optional[int] = None,
+                 model_name: Optional[str] = None) -> dict:
+    run = db.query(BacktestRun).filter(BacktestRun.id == run_id).first()
+    if run is None:
+        raise HTTPException(status_code=404, detail="Backtest not found")
+    if scope is not None and scope not in SCOPES:
+        raise HTTPException(status_code=400, detail=f"scope must be one of {', '.join(SCOPES)}")
+
+    query = db.query(BacktestMetric.scope, BacktestMetric.modelName, BacktestMetric.building, BacktestMetric.n,
+                     BacktestMetric.mae, BacktestMetric.mape, BacktestMetric.rmse) \
+        .filter(BacktestMetric.run_id == run_id)
+    if scope is not None:
+        query = query.filter(BacktestMetric.scope == scope)
+    if building is not None:
+        query = query.filter(BacktestMetric.building == building)
+    if model_name is not None:
+        query = query.filter(BacktestMetric.modelName == model_name)
+    return {**_run_dict(run), "metrics": [row._asdict() for row in query.order_by(BacktestMetric.id)]}
+
+
+def _parse_month(value: str) -> YearMonth:
+    year, month = value.split("-")
+    return int(year), int(month)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backtest the horizon models against actual units")
+    parser.add_argument("start", type=_parse_month, help="first anchor month, YYYY-MM")
+    parser.add_argument("end", type=_parse_month, help="last anchor month, YYYY-MM")
+    parser.add_argument("--models", default="All")
+    args = parser.parse_args(argv)
+
+    import logging_config
+
+    logging_config.setup_logging()
+
+    from database import SessionLocal, engine
+
+    ensure_tables(engine)
+    db = SessionLocal()
+    try:
+        run_id = run_backtest(db, args.start, args.end, args.models)
+        report = get_backtest(db, run_id, scope="horizon")
+    finally:
+        db.close()
+    print(f"run {run_id}: {report['anchors']} anchors, {report['samples']} samples in {report['duration']:.2f}s")
+    for metric in report["metrics"]:
+        mape = f"{metric['mape']:.1f}%" if metric["mape"] is not None else "-"
+        print(f"{metric['modelName']:>4}  n={metric['n']:<6} MAE={metric['mae']:.1f}  MAPE={mape}  RMSE={metric['rmse']:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
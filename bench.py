@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# ค่าเริ่มต้นของวิทยาเขตจำลอง (ใช้ seed เดิมทุกครั้ง ผลจึงเทียบข้าม commit ได้)
+DEFAULT_BUILDINGS = 40
+DEFAULT_YEARS = 5
+FIRST_YEAR = 2015
+BENCH_PASSWORD = "bench-password"
+# เดือนที่เปิดภาคเรียน/มีสอบ ใช้สร้าง semesterStatus, examStatus และรูปแบบการใช้ไฟ
+SEMESTER_MONTHS = {1, 2, 3, 4, 6, 7, 8, 9, 10, 11}
+EXAM_MONTHS = {3, 4, 10, 11}
+HOT_MONTHS = {3, 4, 5}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed_campus(db, buildings: int, years: int, members: int, seed: int = 0) -> dict:
+    """Fill an empty database with a synthetic campus: buildings, monthly units and campus-wide data."""
+    from bulk import insert_rows
+    from models import Building, ExamStatus, Member, NumberOfUsers, SemesterStatus, Unit
+    from security import hash_password
+
+    rng = random.Random(seed)
+    months = [(FIRST_YEAR + i // 12, i % 12 + 1) for i in range(years * 12)]
+
+    insert_rows(db, Building, [
+        {"code": f"B{i:03d}", "name": f"Building {i}", "area": str(rng.randint(800, 30000))}
+        for i in range(1, buildings + 1)
+    ])
+    db.flush()
+    building_rows = db.query(Building.id, Building.area).order_by(Building.id).all()
+
+    insert_rows(db, NumberOfUsers, [
+        {"years": y, "month": m, "amount": int(rng.gauss(22000, 1500) * (1.0 if m in SEMESTER_MONTHS else 0.4))}
+        for y, m in months
+    ])
+    insert_rows(db, SemesterStatus, [{"years": y, "month": m, "status": m in SEMESTER_MONTHS} for y, m in months])
+    insert_rows(db, ExamStatus, [{"years": y, "month": m, "status": m in EXAM_MONTHS} for y, m in months])
+
+    units = []
+    for building_id, area in building_rows:
+        base = float(area) * rng.uniform(4.0, 9.0)
+        for i, (y, m) in enumerate(months):
+            factor = (1.25 if m in HOT_MONTHS else 1.0) * (1.1 if m in SEMESTER_MONTHS else 0.7) * (1 + 0.01 * i / 12)
+            units.append({"years": y, "month": m, "amount": int(base * factor * rng.uniform(0.9, 1.1)),
+                          "idBuilding": building_id})
+    insert_rows(db, Unit, units)
+
+    # hash ครั้งเดียวใช้กับทุกบัญชี (PBKDF2 ช้าโดยตั้งใจ) การ login ยังต้อง verify เต็มรอบทุกครั้ง
+    password = hash_password(BENCH_PASSWORD)
+    insert_rows(db, Member, [
+        {"username": f"bench{i}", "password": password, "fname": "Bench", "lname": str(i),
+         "email": f"bench{i}@example.com", "phone": "", "status": 1}
+        for i in range(members)
+    ])
+    db.commit()
+    return {"buildings": len(building_rows), "months": len(months), "units": len(units), "members": members}
+
+
+def summarize(samples: List[float], queries: Optional[int] = None, wall: Optional[float] = None) -> dict:
+    values = np.asarray(samples) * 1000
+    result = {
+        "n": len(samples),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+    if queries is not None:
+        result["queries_per_op"] = round(queries / len(samples), 2)
+    if wall:
+        result["ops_per_s"] = round(len(samples) / wall, 1)
+    return result
+
+
+def measure(operation: Callable[[int], None], iterations: int, concurrency: int = 1,
+            before: Optional[Callable[[int], None]] = None) -> dict:
+    """Time ``operation(i)`` for each i; ``before(i)`` runs untimed and is excluded from query counts."""
+    import metrics
+
+    samples: List[float] = []
+    queries = 0
+
+    def timed(i: int) -> float:
+        started = time.perf_counter()
+        operation(i)
+        return time.perf_counter() - started
+
+    if concurrency <= 1:
+        for i in range(iterations):
+            if before:
+                before(i)
+            count = metrics.DB_QUERIES.value()
+            samples.append(timed(i))
+            queries += metrics.DB_QUERIES.value() - count
+        return summarize(samples, queries)
+
+    count = metrics.DB_QUERIES.value()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(timed, range(iterations)))
+    wall = time.perf_counter() - started
+    return summarize(samples, metrics.DB_QUERIES.value() - count, wall)
+
+
+def run_benchmarks(args, campus: dict) -> Dict[str, dict]:
+    from fastapi.testclient import TestClient
+
+    import main
+    from database import SessionLocal
+    from features import LAG_MONTHS
+    from model_registry import registry
+    from models import PredictionTable
+    from predict import predict
+    from schemas import PredictionRequest
+
+    rng = random.Random(args.seed)
+    months = [(FIRST_YEAR + i // 12, i % 12 + 1) for i in range(LAG_MONTHS, campus["months"])]
+    anchors = [rng.choice(months) for _ in range(args.iterations)]
+    request = lambda i: PredictionRequest(year=anchors[i][0], month=anchors[i][1], modelName="All")
+    results = {}
+
+    db = SessionLocal()
+    try:
+        # cold: ล้างโมเดลที่โหลดไว้ทุกครั้ง จึงรวมเวลาโหลด T1-T12 จากดิสก์
+        results["predict_cold"] = measure(lambda i: predict(request(i), db), args.iterations,
+                                          before=lambda i: registry.clear())
+        results["predict_warm"] = measure(lambda i: predict(request(i), db), args.iterations)
+    finally:
+        db.close()
+
+    def clear_predictions(i: int):
+        with SessionLocal() as session:
+            session.query(PredictionTable).filter_by(year_current=anchors[i][0], month_current=anchors[i][1]).delete()
+            session.commit()
+
+    with TestClient(main.app) as client:
+        def post(path: str, body: dict, expect: int = 200):
+            response = client.post(path, json=body)
+            if response.status_code != expect:
+                raise RuntimeError(f"POST {path} returned {response.status_code}: {response.text[:200]}")
+            return response
+
+        forecast = lambda i: post("/predict-or-fetch", {"year": anchors[i][0], "month": anchors[i][1], "modelName": "All"})
+        results["predict_or_fetch_miss"] = measure(forecast, args.iterations, before=clear_predictions)
+        results["predict_or_fetch_hit"] = measure(forecast, args.iterations)
+
+        def unit_cycle(i: int):
+            # สร้าง ค้นหา อ่าน แก้ และลบ 1 แถวต่อรอบ (5 request)
+            body = {"years": 2100 + i // 12, "month": i % 12 + 1, "amount": 1000 + i,
+                    "idBuilding": 1 + i % campus["buildings"]}
+            post("/units/", body)
+            listed = client.get("/units/", params={"building": body["idBuilding"], "year_from": body["years"],
+                                                   "month_from": body["month"], "year_to": body["years"],
+                                                   "month_to": body["month"], "limit": 1}).json()
+            unit_id = listed["items"][0]["id"]
+            client.get(f"/units/{unit_id}").raise_for_status()
+            client.put(f"/units/{unit_id}", json={**body, "amount": body["amount"] + 1}).raise_for_status()
+            client.delete(f"/units/{unit_id}").raise_for_status()
+
+        results["crud_unit_cycle"] = measure(unit_cycle, args.crud_ops, args.concurrency)
+        results["login"] = measure(
+            lambda i: post("/login/", {"username": f"bench{i % campus['members']}", "password": BENCH_PASSWORD}),
+            args.logins, args.concurrency)
+    return results
+
+
+def format_report(report: dict, baseline: Optional[dict] = None) -> str:
+    lines = [
+        f"commit {report['commit'] or '-'}  {report['created_at']}  db={report['database']}",
+        "campus: " + ", ".join(f"{key}={value}" for key, value in report["campus"].items())
+        + f"  seed={report['seed']}  concurrency={report['concurrency']}",
+        f"{'benchmark':<24}{'n':>6}{'p50 ms':>11}{'p99 ms':>11}{'mean ms':>11}{'queries/op':>12}{'ops/s':>9}",
+    ]
+    for name, row in report["results"].items():
+        line = (f"{name:<24}{row['n']:>6}{row['p50_ms']:>11.2f}{row['p99_ms']:>11.2f}{row['mean_ms']:>11.2f}"
+                f"{row.get('queries_per_op', '-'):>12}{row.get('ops_per_s', '-'):>9}")
+        old = (baseline or {}).get("results", {}).get(name)
+        if old:
+            line += f"   p50 {row['p50_ms'] / old['p50_ms'] - 1:+.0%} vs {baseline.get('commit') or 'baseline'}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Seed a synthetic campus and benchmark forecasts, CRUD and login")
+    parser.add_argument("--buildings", type=int, default=DEFAULT_BUILDINGS)
+    parser.add_argument("--years", type=int, default=DEFAULT_YEARS)
+    parser.add_argument("--members", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=20, help="forecast runs per benchmark")
+    parser.add_argument("--crud-ops", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--database-url", default="sqlite:///bench.db",
+                        help="empty database to seed; SQLite files are recreated on every run")
+    parser.add_argument("--output", default="bench_output.txt")
+    parser.add_argument("--json", help="also write the results as JSON (e.g. to compare later)")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    # ต้องตั้งค่าก่อน import database/main เพราะ engine ถูกสร้างตอน import
+    if args.database_url.startswith("sqlite:///"):
+        path = args.database_url[len("sqlite:///"):]
+        if path and os.path.exists(path):
+            os.remove(path)
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["DB_MODE"] = "sync"
+
+    import logging_config
+
+    logging_config.setup_logging()
+
+    import backtest
+    import feature_store
+    import models
+    from database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    feature_store.ensure_table(engine)
+    backtest.ensure_tables(engine)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        campus = seed_campus(db, args.buildings, args.years, args.members, args.seed)
+        feature_store.rebuild(db)
+        db.commit()
+        print(f"seeded {campus} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        db.close()
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "database": engine.dialect.name,
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+        "campus": campus,
+        "results": run_benchmarks(args, campus),
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    text = format_report(report, baseline)
+    print(text)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(text + "\n")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
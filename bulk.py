@@ -0,0 +1,42 @@
+from typing import Iterable, List, Optional, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def _dialect_insert(db: Session, model):
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        return dialect, mysql.insert(model)
+    if dialect == "sqlite":
+        return dialect, sqlite.insert(model)
+    if dialect == "postgresql":
+        return dialect, postgresql.insert(model)
+    return dialect, insert(model)
+
+
+def insert_rows(db: Session, model, rows: List[dict], conflict_keys: Optional[Sequence[str]] = None,
+                update_columns: Optional[Iterable[str]] = None) -> None:
+    """Insert many rows in one executemany round-trip.
+
+    When ``conflict_keys`` is given and the dialect supports it, rows that hit
+    the unique key on those columns update ``update_columns`` instead
+    (MySQL ON DUPLICATE KEY UPDATE / SQLite and PostgreSQL ON CONFLICT).
+    """
+    if not rows:
+        return
+    if not conflict_keys:
+        db.execute(insert(model), rows)
+        return
+
+    update_columns = list(update_columns or [c for c in rows[0] if c not in conflict_keys])
+    dialect, stmt = _dialect_insert(db, model)
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in update_columns})
+    elif dialect in ("sqlite", "postgresql"):
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(conflict_keys),
+            set_={c: stmt.excluded[c] for c in update_columns},
+        )
+    db.execute(stmt, rows)
@@ -0,0 +1,83 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# การเชื่อมต่อฐานข้อมูลและ connection pool (ใช้ร่วมกันทั้งระบบผ่าน database.make_engine)
+DATABASE_URL = os.getenv("DATABASE_URL", "mysql+pymysql://root:@localhost/efsdata")
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+# ต้องน้อยกว่า wait_timeout ของ MySQL เพื่อไม่ให้ได้ connection ที่ถูกตัดไปแล้ว
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+DB_POOL_TIMEOUT = _env_float("DB_POOL_TIMEOUT", 30)
+DB_CONNECT_TIMEOUT = _env_int("DB_CONNECT_TIMEOUT", 10)
+
+
+# จำนวน process สำหรับรันโมเดล T1-T12 แบบขนาน (0 หรือ 1 = รันใน request thread ตามเดิม)
+PREDICT_WORKERS = _env_int("PREDICT_WORKERS", 0)
+# แบ่งอาคารเป็นก้อนละกี่อาคารต่อหนึ่ง task (0 = ไม่แบ่ง แยกงานตาม horizon อย่างเดียว)
+PREDICT_CHUNK_SIZE = _env_int("PREDICT_CHUNK_SIZE", 0)
+
+# backend ที่ใช้รันโมเดล: "sklearn" (ค่าเดิม) หรือ "flat" (tree_eval.FlatTreeEnsemble)
+# flat ใช้หน่วยความจำน้อยกว่าและเร็วกว่าเมื่อพยากรณ์ทีละเดือน (หลักสิบแถว) แต่ช้ากว่า sklearn เมื่อรันทีละหลายพันแถว
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "sklearn")
+# ชื่อเวอร์ชันของ models/T*.pkl เดิม (ยังไม่มีการ promote) ใช้ทั้งใน model_registry และ predictiontable.model_version
+BASE_VERSION = "base"
+
+# อ่าน lag features จากตาราง featurestore ที่คำนวณไว้ล่วงหน้า (เดือนที่ยังไม่มีในตารางจะคำนวณจากข้อมูลดิบเหมือนเดิม)
+FEATURE_STORE = _env_bool("FEATURE_STORE", True)
+
+# จำนวน process ที่ใช้ train โมเดลแต่ละ horizon พร้อมกัน (0 = เท่าจำนวน CPU)
+TRAIN_WORKERS = _env_int("TRAIN_WORKERS", 0)
+
+# จำนวนผลพยากรณ์รายแถวที่ rolling forecast จำไว้ใช้ซ้ำ (ระหว่าง scenario และระหว่าง request)
+ROLLING_CACHE_SIZE = _env_int("ROLLING_CACHE_SIZE", 20000)
+
+# จำนวน thread ที่รันงานพยากรณ์แบบ background และจำนวนงานที่เสร็จแล้วที่เก็บไว้ให้ถามสถานะ
+JOB_WORKERS = _env_int("JOB_WORKERS", 1)
+JOB_HISTORY = _env_int("JOB_HISTORY", 200)
+
+# โหมดฐานข้อมูลของ endpoint CRUD/อ่านผลพยากรณ์: "sync" (PyMySQL ตามเดิม) หรือ "async"
+DB_MODE = os.getenv("DB_MODE", "sync")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "mysql+aiomysql://root:@localhost/efsdata")
+
+# การ hash รหัสผ่าน: จำนวนรอบของ PBKDF2 สำหรับ hash ใหม่ (hash เก่าที่รอบน้อยกว่าจะถูกอัปเกรดตอน login)
+PASSWORD_ITERATIONS = _env_int("PASSWORD_ITERATIONS", 100000)
+# จำนวน thread ที่ใช้คำนวณ PBKDF2 พร้อมกันได้สูงสุด
+PASSWORD_HASH_WORKERS = _env_int("PASSWORD_HASH_WORKERS", 2)
+# session token: ถ้าไม่กำหนด SESSION_SECRET จะสุ่มใหม่ทุกครั้งที่เริ่มระบบ (token เดิมใช้ไม่ได้ และใช้ข้าม worker ไม่ได้)
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+SESSION_TTL = _env_int("SESSION_TTL", 3600)
+
+# cache ของ response GET (check-predictions, current-month, อาคาร/หน่วยไฟฟ้า) จำนวนรายการและอายุเป็นวินาที (0 = ปิด)
+RESPONSE_CACHE_SIZE = _env_int("RESPONSE_CACHE_SIZE", 1024)
+RESPONSE_CACHE_TTL = _env_float("RESPONSE_CACHE_TTL", 300)
+
+# log: เขียนผ่านคิวโดย thread เบื้องหลังลง log/efs.log และหมุนไฟล์เมื่อเกิน LOG_MAX_BYTES (เก็บไว้ LOG_BACKUPS ไฟล์)
+LOG_DIR = os.getenv("LOG_DIR", "log")
+LOG_FILE = os.getenv("LOG_FILE", "efs.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# ระดับ log รายโมดูล เช่น "predict=DEBUG,sqlalchemy.engine=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_MAX_BYTES = _env_int("LOG_MAX_BYTES", 10 * 1024 * 1024)
+LOG_BACKUPS = _env_int("LOG_BACKUPS", 10)
+# เขียน log เป็น JSON บรรทัดละรายการแทนข้อความ
+LOG_JSON = _env_bool("LOG_JSON", False)
+# บันทึก feature 51 ค่าของทุกอาคารในแต่ละการพยากรณ์ (ระดับ DEBUG ของ predict)
+LOG_FEATURES = _env_bool("LOG_FEATURES", False)
@@ -1,10 +1,123 @@
+import threading
+import time
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+
+import config
+
+DATABASE_URL = config.DATABASE_URL
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """TimedQueuePool for the async engine (waits for a connection without blocking the event loop)."""
+
+
+def _pool_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        # SQLite ใช้สำหรับทดสอบ/benchmark; ฐานข้อมูลใน memory ต้องใช้ connection เดียวกันตลอด
+        options = {"connect_args": {"check_same_thread": False}}
+        if ":memory:" in url or url.rstrip("/").endswith("sqlite:"):
+            options["poolclass"] = StaticPool
+        return options
+
+    options = {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+    }
+    if url.startswith("mysql"):
+        options["connect_args"] = {"connect_timeout": config.DB_CONNECT_TIMEOUT}
+    return options
 
-DATABASE_URL = "mysql+pymysql://root:@localhost/efsdata"
 
-engine = create_engine(DATABASE_URL)
+def make_engine(url: str = None):
+    url = url or DATABASE_URL
+    options = _pool_options(url)
+    if "poolclass" not in options:
+        options["poolclass"] = TimedQueuePool
+    return create_engine(url, **options)
+
+
+def make_async_engine(url: str = None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = url or config.ASYNC_DATABASE_URL
+    options = _pool_options(url)
+    if "poolclass" not in options:
+        options["poolclass"] = TimedAsyncQueuePool
+    return create_async_engine(url, **options)
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update({
+                "checkouts": pool.checkouts,
+                "timeouts": pool.timeouts,
+                "wait_seconds_total": round(pool.wait_total, 6),
+                "wait_seconds_max": round(pool.wait_max, 6),
+                "wait_seconds_avg": round(pool.wait_total / pool.checkouts, 6) if pool.checkouts else 0.0,
+            })
+    return stats
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+# engine แบบ async ใช้เมื่อ DB_MODE=async (ต้องติดตั้ง aiomysql/asyncmy หรือ aiosqlite สำหรับทดสอบ)
+async_engine = None
+AsyncSessionLocal = None
+
+if config.DB_MODE == "async":
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async_engine = make_async_engine()
+    AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,62 @@
+import json
+from typing import Any, Iterable, List
+
+from fastapi import HTTPException, Response
+
+from models import PredictionTable
+from schemas import PredictionResponse
+
+try:
+    import orjson
+except ImportError:  # ไม่มี orjson ก็ใช้ json ของ Python แทน (ผลลัพธ์เหมือนกัน แต่ช้ากว่า)
+    orjson = None
+
+# format ของผลพยากรณ์: json = ผ่าน PredictionResponse ตามเดิม, rows = แถวเดียวกันแต่ไม่สร้าง model ทีละแถว,
+# columnar = {"count": n, "columns": {field: [ค่า...]}} สำหรับกราฟ (เล็กกว่าเพราะไม่ซ้ำชื่อ field ทุกแถว)
+FORMATS = ("json", "rows", "columnar")
+PREDICTION_FIELDS = tuple(PredictionResponse.model_fields)
+# เลือกเฉพาะคอลัมน์ที่อยู่ใน PredictionResponse ไม่โหลด ORM object ทั้งแถว
+PREDICTION_COLUMNS = tuple(getattr(PredictionTable, name) for name in PREDICTION_FIELDS)
+# แปลงชนิดตาม PredictionResponse (เช่น Decimal หรือ int จาก MySQL -> float) แทนการ validate ด้วย pydantic
+_CASTS = tuple(PredictionResponse.model_fields[name].annotation for name in PREDICTION_FIELDS)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def check_format(fmt: str) -> None:
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+
+
+def _values(row) -> tuple:
+    # row เป็นได้ทั้ง Row ที่เลือกคอลัมน์ตาม PREDICTION_FIELDS, ORM object และ dict จาก predict()
+    if isinstance(row, dict):
+        values = (row[name] for name in PREDICTION_FIELDS)
+    elif hasattr(row, "_mapping"):
+        values = iter(row)
+    else:
+        values = (getattr(row, name) for name in PREDICTION_FIELDS)
+    return tuple(None if value is None else cast(value) for cast, value in zip(_CASTS, values))
+
+
+def prediction_payload(rows: Iterable, fmt: str) -> bytes:
+    """Serialize prediction rows as ``rows`` (PredictionResponse objects) or ``columnar`` arrays."""
+    values: List[tuple] = [_values(row) for row in rows]
+    if fmt == "columnar":
+        columns = zip(*values) if values else [()] * len(PREDICTION_FIELDS)
+        return dumps({"count": len(values),
+                      "columns": {name: list(column) for name, column in zip(PREDICTION_FIELDS, columns)}})
+    return dumps([dict(zip(PREDICTION_FIELDS, row)) for row in values])
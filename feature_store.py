@@ -0,0 +1,185 @@
+import argparse
+import json
+import logging
+import sys
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+import config
+import metrics
+from bulk import insert_rows
+from features import LAG_MONTHS, FeatureHistory, FeatureRow, YearMonth, assemble_features, shift_month
+from models import Building, ExamStatus, FeatureStore, NumberOfUsers, SemesterStatus, Unit
+
+logger = logging.getLogger(__name__)
+
+CAMPUS_WIDE = (NumberOfUsers, ExamStatus, SemesterStatus)
+
+
+def ensure_table(bind) -> None:
+    FeatureStore.__table__.create(bind=bind, checkfirst=True)
+
+
+def _store_row(history: FeatureHistory, building_id: int, year: int, month: int) -> Optional[dict]:
+    row = history.feature_row(building_id, year, month)
+    if row is None:
+        return None
+    return {
+        "idBuilding": building_id,
+        "years": year,
+        "month": month,
+        "idUnit": history.unit_ids.get((year, month, building_id)),
+        "area": row.area,
+        "unit": row.unit,
+        "features": json.dumps(row.data),
+    }
+
+
+def _materialized(db: Session, start: YearMonth, end: YearMonth) -> Set[YearMonth]:
+    rows = db.query(FeatureStore.years, FeatureStore.month) \
+        .filter(FeatureStore.years.between(start[0], end[0])).distinct()
+    return {(years, month) for years, month in rows}
+
+
+def refresh(db: Session, periods: Iterable[YearMonth], building_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute stored features affected by writes to the given months (no commit).
+
+    A reading in month p is a lag of months p..p+11, so all of those anchors are
+    rebuilt. With ``building_ids`` only those buildings are replaced in anchors
+    that are already stored; anchors not stored yet are always built for every
+    building so a stored month is never partial.
+    """
+    anchors = sorted({shift_month(y, m, d) for y, m in periods for d in range(LAG_MONTHS + 1)})
+    if not anchors:
+        return 0
+    targets = set(building_ids) if building_ids is not None else None
+    materialized = _materialized(db, anchors[0], anchors[-1]) if targets is not None else set()
+    history = FeatureHistory.load(db, shift_month(*anchors[0], -LAG_MONTHS), anchors[-1])
+
+    rows = []
+    for year, month in anchors:
+        stale = db.query(FeatureStore).filter(FeatureStore.years == year, FeatureStore.month == month)
+        only = targets if (year, month) in materialized else None
+        if only is not None:
+            stale = stale.filter(FeatureStore.idBuilding.in_(only))
+        stale.delete(synchronize_session=False)
+        for building_id in history.buildings_with_unit(year, month):
+            if only is not None and building_id not in only:
+                continue
+            row = _store_row(history, building_id, year, month)
+            if row is not None:
+                rows.append(row)
+    insert_rows(db, FeatureStore, rows)
+    logger.info("Feature store refreshed %d anchor months (%d rows)", len(anchors), len(rows))
+    return len(rows)
+
+
+def refresh_building(db: Session, building_id: int) -> int:
+    # พื้นที่อาคารอยู่ในทุกแถวของอาคารนั้น จึงคำนวณใหม่เฉพาะเดือนที่เก็บไว้แล้ว
+    periods = {(years, month) for years, month in
+               db.query(FeatureStore.years, FeatureStore.month).filter(FeatureStore.idBuilding == building_id)}
+    if not periods:
+        return 0
+    return refresh(db, periods, [building_id])
+
+
+def _previous(record, names: Tuple[str, ...]) -> dict:
+    # ค่าก่อนแก้ไขของแถวที่ยังไม่ flush (ถ้าไม่ได้แก้คือค่าปัจจุบัน)
+    state = inspect(record)
+    values = {}
+    for name in names:
+        history = state.attrs[name].history
+        values[name] = history.deleted[0] if history.deleted else getattr(record, name)
+    return values
+
+
+def refresh_record(db: Session, record) -> int:
+    """Keep the store in step with one created/updated/deleted row; call before commit."""
+    if not config.FEATURE_STORE:
+        return 0
+    if isinstance(record, Building):
+        if record in db.new:
+            return 0
+        if record in db.deleted or inspect(record).attrs.area.history.has_changes():
+            db.flush()
+            return refresh_building(db, record.id)
+        return 0
+    if isinstance(record, Unit):
+        before = _previous(record, ("years", "month", "idBuilding"))
+        db.flush()  # SessionLocal ใช้ autoflush=False ต้อง flush ก่อนอ่านข้อมูลใหม่
+        periods = {(record.years, record.month), (before["years"], before["month"])}
+        return refresh(db, periods, {record.idBuilding, before["idBuilding"]})
+    if isinstance(record, CAMPUS_WIDE):
+        before = _previous(record, ("years", "month"))
+        db.flush()
+        return refresh(db, {(record.years, record.month), (before["years"], before["month"])})
+    return 0
+
+
+def rebuild(db: Session) -> int:
+    """Rebuild the whole store from the raw tables (no commit)."""
+    db.query(FeatureStore).delete(synchronize_session=False)
+    periods = db.query(Unit.years, Unit.month).distinct().all()
+    if not periods:
+        return 0
+    anchors = sorted(set(periods))
+    history = FeatureHistory.load(db, shift_month(*anchors[0], -LAG_MONTHS), anchors[-1])
+    rows = []
+    for year, month in anchors:
+        for building_id in history.buildings_with_unit(year, month):
+            row = _store_row(history, building_id, year, month)
+            if row is not None:
+                rows.append(row)
+    insert_rows(db, FeatureStore, rows)
+    logger.info("Feature store rebuilt: %d anchor months, %d rows", len(anchors), len(rows))
+    return len(rows)
+
+
+def read_anchor(db: Session, year: int, month: int) -> Optional[Tuple[List[int], List[FeatureRow]]]:
+    records = db.query(FeatureStore.idBuilding, FeatureStore.area, FeatureStore.unit, FeatureStore.features) \
+        .filter(FeatureStore.years == year, FeatureStore.month == month) \
+        .order_by(FeatureStore.idUnit).all()
+    if not records:
+        return None
+    rows = [FeatureRow(building_id=building_id, area=area, unit=unit, data=json.loads(features))
+            for building_id, area, unit, features in records]
+    return [row.building_id for row in rows], rows
+
+
+def load_features(db: Session, year: int, month: int) -> Tuple[List[int], List[FeatureRow]]:
+    """Features for one anchor month: one indexed read from the store, else assembled from raw tables."""
+    if config.FEATURE_STORE:
+        stored = read_anchor(db, year, month)
+        if stored is not None:
+            metrics.FEATURE_SOURCE.inc(source="store")
+            return stored
+    metrics.FEATURE_SOURCE.inc(source="assembled")
+    return assemble_features(db, year, month)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain the precomputed feature store")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    import logging_config
+
+    logging_config.setup_logging()
+
+    from database import SessionLocal, engine
+
+    ensure_table(engine)
+    db = SessionLocal()
+    try:
+        count = rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    print(f"{count} feature rows written", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import Building, ExamStatus, NumberOfUsers, SemesterStatus, Unit
+
+# จำนวนเดือนย้อนหลังที่โมเดลใช้ (Unit-1 .. Unit-11)
+LAG_MONTHS = 11
+
+FEATURE_COLUMNS = ['month', 'building', 'Area', 'Eusers'] + \
+                  [f'Eusers-{i}' for i in range(1, LAG_MONTHS + 1)] + \
+                  ['exam'] + \
+                  [f'exam-{i}' for i in range(1, LAG_MONTHS + 1)] + \
+                  ['semester'] + \
+                  [f'semester-{i}' for i in range(1, LAG_MONTHS + 1)] + \
+                  ['Unit'] + \
+                  [f'Unit-{i}' for i in range(1, LAG_MONTHS + 1)]
+
+YearMonth = Tuple[int, int]
+
+
+def shift_month(year: int, month: int, delta: int) -> YearMonth:
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+def lag_window(year: int, month: int) -> List[YearMonth]:
+    # (year, month) ของเดือนปัจจุบันและ 11 เดือนก่อนหน้า เรียงจาก lag 0 ถึง lag 11
+    return [shift_month(year, month, -i) for i in range(LAG_MONTHS + 1)]
+
+
+@dataclass
+class FeatureRow:
+    building_id: int
+    area: str
+    unit: int
+    data: dict
+
+
+class FeatureHistory:
+    """Raw monthly inputs for a range of months, loaded with one query per table.
+
+    Rows are kept in plain dicts keyed by (year, month) so lag vectors for any
+    anchor month inside the range can be pivoted in memory.
+    """
+
+    def __init__(self, buildings: Dict[int, str], units: Dict[Tuple[int, int, int], int],
+                 users: Dict[YearMonth, int], exams: Dict[YearMonth, bool], semesters: Dict[YearMonth, bool],
+                 unit_buildings: Dict[YearMonth, List[int]], unit_ids: Optional[Dict[Tuple[int, int, int], int]] = None):
+        self.buildings = buildings
+        self.units = units
+        self.users = users
+        self.exams = exams
+        self.semesters = semesters
+        self.unit_buildings = unit_buildings
+        # id ของแถว unit ที่ใช้ (แถวแรกของแต่ละอาคาร/เดือน) ใช้เรียงอาคารให้เหมือนลำดับในตาราง unit
+        self.unit_ids = unit_ids or {}
+
+    @classmethod
+    def load(cls, db: Session, start: YearMonth, end: YearMonth,
+             building_ids: Optional[Iterable[int]] = None) -> "FeatureHistory":
+        lo, hi = start[0] * 12 + start[1], end[0] * 12 + end[1]
+
+        def in_range(years, month):
+            return lo <= years * 12 + month <= hi
+
+        # กรองด้วย years (ใช้ index ได้) แล้วค่อยตัดเดือนที่เกินช่วงใน Python
+        unit_query = db.query(Unit.id, Unit.years, Unit.month, Unit.idBuilding, Unit.amount) \
+            .filter(Unit.years.between(start[0], end[0]))
+        if building_ids is not None:
+            unit_query = unit_query.filter(Unit.idBuilding.in_(list(building_ids)))
+
+        units: Dict[Tuple[int, int, int], int] = {}
+        unit_buildings: Dict[YearMonth, List[int]] = {}
+        unit_ids: Dict[Tuple[int, int, int], int] = {}
+        for unit_id, years, month, id_building, amount in unit_query.order_by(Unit.id):
+            if not in_range(years, month):
+                continue
+            key = (years, month, id_building)
+            if key in units:  # ถ้ามีซ้ำให้ใช้แถวแรก เหมือน .first()
+                continue
+            units[key] = amount
+            unit_ids[key] = unit_id
+            unit_buildings.setdefault((years, month), []).append(id_building)
+
+        def campus_wide(model, value):
+            rows = db.query(model.years, model.month, value) \
+                .filter(model.years.between(start[0], end[0])) \
+                .order_by(model.id)
+            result = {}
+            for years, month, v in rows:
+                if in_range(years, month):
+                    result.setdefault((years, month), v)
+            return result
+
+        users = campus_wide(NumberOfUsers, NumberOfUsers.amount)
+        exams = campus_wide(ExamStatus, ExamStatus.status)
+        semesters = campus_wide(SemesterStatus, SemesterStatus.status)
+
+        ids = {key[2] for key in units}
+        buildings = {}
+        if ids:
+            buildings = dict(db.query(Building.id, Building.area).filter(Building.id.in_(ids)))
+
+        return cls(buildings, units, users, exams, semesters, unit_buildings, unit_ids)
+
+    @classmethod
+    def for_anchor(cls, db: Session, year: int, month: int) -> "FeatureHistory":
+        return cls.load(db, shift_month(year, month, -LAG_MONTHS), (year, month))
+
+    def buildings_with_unit(self, year: int, month: int) -> List[int]:
+        return list(self.unit_buildings.get((year, month), []))
+
+    def feature_row(self, building_id: int, year: int, month: int) -> Optional[FeatureRow]:
+        if building_id not in self.buildings:
+            return None
+        area = self.buildings[building_id]
+        unit_amount = self.units.get((year, month, building_id), 0)
+
+        data = {
+            "month": month,
+            "building": str(building_id),
+            "Area": area,
+            "Unit": unit_amount,
+            "Eusers": self.users.get((year, month), 0),
+            "exam": self.exams.get((year, month), 0),
+            "semester": self.semesters.get((year, month), 0),
+        }
+        for i, (prev_year, prev_month) in enumerate(lag_window(year, month)[1:], start=1):
+            data[f"Eusers-{i}"] = self.users.get((prev_year, prev_month), 0)
+            data[f"exam-{i}"] = self.exams.get((prev_year, prev_month), 0)
+            data[f"semester-{i}"] = self.semesters.get((prev_year, prev_month), 0)
+            data[f"Unit-{i}"] = self.units.get((prev_year, prev_month, building_id), 0)
+
+        return FeatureRow(building_id=building_id, area=area, unit=unit_amount, data=data)
+
+
+def assemble_features(db: Session, year: int, month: int) -> Tuple[List[int], List[FeatureRow]]:
+    """Return the building ids with a reading in (year, month) and their lag features."""
+    history = FeatureHistory.for_anchor(db, year, month)
+    building_ids = history.buildings_with_unit(year, month)
+    rows = []
+    for building_id in building_ids:
+        row = history.feature_row(building_id, year, month)
+        if row is not None:
+            rows.append(row)
+    return building_ids, rows
+
+
+def _as_float(value) -> float:
+    # Area เก็บเป็น String ในตาราง building, boolean ของ exam/semester แปลงเป็น 0/1
+    if value is None or value == "":
+        return np.nan
+    return float(value)
+
+
+def feature_matrix(rows: List[FeatureRow]) -> np.ndarray:
+    """Stack feature rows into a (buildings x 51) float64 matrix in FEATURE_COLUMNS order."""
+    matrix = np.empty((len(rows), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for r, row in enumerate(rows):
+        data = row.data
+        matrix[r] = [_as_float(data[column]) for column in FEATURE_COLUMNS]
+    return matrix
@@ -0,0 +1,96 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+import logging_config
+from features import FEATURE_COLUMNS
+from model_registry import HORIZON_MODELS, registry
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker(model_names: List[str], log_queue=None) -> None:
+    logging_config.setup_worker_logging(log_queue)
+    # โหลดโมเดลไว้ในแต่ละ worker ครั้งเดียว task จึงส่งแค่ชื่อโมเดลกับ feature matrix
+    registry.warm_up(model_names)
+
+
+def _predict_task(model_name: str, X: np.ndarray, model_version: Optional[str] = None) -> np.ndarray:
+    # ใช้เวอร์ชันที่ process หลักเลือกไว้ ไม่อ่าน CURRENT เองใน worker
+    frame = pd.DataFrame(X, columns=FEATURE_COLUMNS, copy=False)
+    return registry.get(model_name, model_version).predict(frame)
+
+
+def _mp_context():
+    # ไม่ใช้ fork: server มีหลาย thread (threadpool, job, log listener) ถ้า fork ขณะ thread อื่นถือ lock อยู่
+    # (registry, logging, connection pool) process ลูกอาจค้าง forkserver เริ่ม worker จาก process ที่ไม่มี thread อื่น
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["forecast_pool"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def enabled() -> bool:
+    return config.PREDICT_WORKERS > 1
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                logger.info("Starting forecast process pool with %d workers", config.PREDICT_WORKERS)
+                context = _mp_context()
+                _executor = ProcessPoolExecutor(
+                    max_workers=config.PREDICT_WORKERS,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(HORIZON_MODELS, logging_config.worker_log_queue(context)),
+                )
+    return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _chunks(n_rows: int, chunk_size: int):
+    if chunk_size <= 0 or chunk_size >= n_rows:
+        return [slice(0, n_rows)]
+    return [slice(start, min(start + chunk_size, n_rows)) for start in range(0, n_rows, chunk_size)]
+
+
+def predict_parallel(model_names: List[str], X: np.ndarray,
+                     on_horizon: Optional[Callable[[str], None]] = None, model_version: Optional[str] = None) -> np.ndarray:
+    """Fan (horizon, building chunk) tasks out to the pool; returns (models x buildings)."""
+    executor = get_executor()
+    tasks = []
+    for i, model_name in enumerate(model_names):
+        for rows in _chunks(len(X), config.PREDICT_CHUNK_SIZE):
+            tasks.append((i, rows, executor.submit(_predict_task, model_name, X[rows], model_version)))
+
+    # เก็บผลตามตำแหน่งของ task ไม่ใช่ลำดับที่เสร็จ ผลลัพธ์จึงเรียงเหมือนเดิมทุกครั้ง
+    results = np.empty((len(model_names), len(X)), dtype=np.float64)
+    pending = [0] * len(model_names)
+    for i, _, _ in tasks:
+        pending[i] += 1
+    for i, rows, future in tasks:
+        results[i, rows] = future.result()
+        pending[i] -= 1
+        if on_horizon and pending[i] == 0:
+            on_horizon(model_names[i])
+    return results
@@ -0,0 +1,124 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+import metrics
+from bulk import insert_rows
+from model_registry import registry
+from models import PredictionTable
+from predict import parse_model_names, predict
+from schemas import PredictionRequest
+
+
+class SingleFlight:
+    """Per-key locks so concurrent identical forecasts are computed only once."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: Dict[tuple, list] = {}
+
+    @contextmanager
+    def hold(self, key: tuple):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+_single_flight = SingleFlight()
+
+
+def check_existing_prediction(db: Session, year: int, month: int, model_names: Optional[List[str]] = None,
+                              columns: Optional[Sequence] = None, model_version: Optional[str] = None):
+    # columns: เลือกเฉพาะบางคอลัมน์ (ได้ Row แทน ORM object) ต้องมี building และ modelName ถ้าระบุ model_names
+    # model_version: ค่าเริ่มต้นคือเวอร์ชันที่ใช้พยากรณ์อยู่ ผลของเวอร์ชันก่อน promote จึงไม่ถูกส่งกลับ
+    query = db.query(*columns) if columns else db.query(PredictionTable)
+    query = query.filter(PredictionTable.year_current == year, PredictionTable.month_current == month,
+                         PredictionTable.model_version == (model_version or registry.serving_version()))
+    if model_names is not None:
+        query = query.filter(PredictionTable.modelName.in_(model_names))
+    existing_predictions = query.order_by(PredictionTable.id).all()
+    if model_names is None:
+        return existing_predictions
+
+    # แถวซ้ำ (building, modelName) ที่เคยบันทึกไว้ให้ใช้แถวแรก แล้วเรียงตามอาคารและลำดับโมเดลที่ขอ
+    order = {name: i for i, name in enumerate(model_names)}
+    unique = {}
+    for row in existing_predictions:
+        unique.setdefault((row.building, row.modelName), row)
+    buildings = list(dict.fromkeys(row.building for row in unique.values()))
+    position = {building: i for i, building in enumerate(buildings)}
+    return sorted(unique.values(), key=lambda row: (position[row.building], order[row.modelName]))
+
+
+PREDICTION_KEY = ("building", "modelName", "year_current", "month_current", "model_version")
+
+
+def save_prediction_to_db(db: Session, predictions: List[dict], model_version: Optional[str] = None):
+    model_version = model_version or registry.serving_version()
+    # เขียนทั้งชุดด้วย executemany ครั้งเดียว ถ้าซ้ำ natural key ให้อัปเดตค่าแทนการเพิ่มแถวซ้ำ
+    rows = [
+        {
+            "building": prediction['building'],
+            "area": prediction['area'],
+            "prediction": prediction['prediction'],
+            "unit": prediction['unit'],
+            "modelName": prediction['modelName'],
+            "month_current": prediction['month_current'],
+            "year_current": prediction['year_current'],
+            "month_predict": prediction['month_predict'],
+            "year_predict": prediction['year_predict'],
+            "model_version": model_version,
+        }
+        for prediction in predictions
+    ]
+    with metrics.stage("persistence"):
+        insert_rows(db, PredictionTable, rows, conflict_keys=PREDICTION_KEY)
+        db.commit()
+
+
+def _missing_models(existing, model_names: List[str]) -> List[str]:
+    cached = {row.modelName for row in existing}
+    return [name for name in model_names if name not in cached]
+
+
+def predict_or_fetch(request: PredictionRequest, db: Session,
+                     progress: Optional[Callable[[str, int, int], None]] = None, columns: Optional[Sequence] = None,
+                     model_version: Optional[str] = None):
+    year, month = request.year, request.month
+    model_names = parse_model_names(request.modelName)
+    # อ่านเวอร์ชันครั้งเดียว แล้วใช้ทั้งตอนค้น ตอนพยากรณ์ และตอนบันทึก (promote ระหว่างทางจึงไม่ทำให้ผลปนเวอร์ชัน)
+    version = model_version or registry.serving_version()
+
+    # ตรวจสอบว่ามีผลของโมเดลที่ขอในฐานข้อมูลครบหรือไม่ (cache แยกตาม year, month, model และเวอร์ชันโมเดล)
+    existing_predictions = check_existing_prediction(db, year, month, model_names, columns, version)
+    if not _missing_models(existing_predictions, model_names):
+        metrics.FORECAST_CACHE.inc(result="hit")
+        return existing_predictions
+
+    # คำขอของเดือนเดียวกันที่เข้ามาพร้อมกันจะรอกัน และคำนวณเฉพาะ horizon ที่ยังไม่มี
+    with _single_flight.hold((year, month, version)):
+        db.rollback()  # เริ่ม transaction ใหม่เพื่อให้เห็นแถวที่ request อื่นเพิ่ง commit
+        existing_predictions = check_existing_prediction(db, year, month, model_names, columns, version)
+        missing = _missing_models(existing_predictions, model_names)
+        if not missing:
+            # อีก request คำนวณให้แล้วระหว่างรอ
+            metrics.FORECAST_CACHE.inc(result="hit")
+            return existing_predictions
+        metrics.FORECAST_CACHE.inc(result="partial" if len(missing) < len(model_names) else "miss")
+
+        predictions = predict(PredictionRequest(year=year, month=month, modelName=",".join(missing)), db, progress,
+                              version)
+        # บันทึกผลลัพธ์ลงในฐานข้อมูล
+        save_prediction_to_db(db, predictions, version)
+
+    return check_existing_prediction(db, year, month, model_names, columns, version)
@@ -0,0 +1,160 @@
+import argparse
+import csv
+import io
+import logging
+import sys
+from itertools import islice
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from ingest import INGEST_TABLES, IngestResult, refresh_features, upsert_rows, validate_rows
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+# เก็บรายละเอียดข้อผิดพลาดไว้แค่จำนวนหนึ่ง ไฟล์ใหญ่ที่ผิดทั้งไฟล์จะได้ไม่กินหน่วยความจำ
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportProgress:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add(self, rows: int, result: IngestResult) -> None:
+        self.rows += rows
+        self.inserted += result.inserted
+        self.updated += result.updated
+        self.error_count += len(result.errors)
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        if room > 0:
+            self.errors.extend(result.errors[:room])
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def _clean(row: dict) -> dict:
+    # ตัดช่องว่างของหัวคอลัมน์/ค่า และถือว่าช่องว่างคือไม่มีค่า
+    cleaned = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "":
+                value = None
+        cleaned[str(key).strip()] = value
+    return cleaned
+
+
+def iter_csv_rows(file: BinaryIO) -> Iterator[dict]:
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        for row in csv.DictReader(text):
+            yield _clean(row)
+    finally:
+        text.detach()
+
+
+def iter_xlsx_rows(file: BinaryIO) -> Iterator[dict]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Reading .xlsx files requires openpyxl (pip install openpyxl)")
+
+    # read_only อ่านทีละแถวแบบ stream ไม่โหลดทั้ง sheet เข้าหน่วยความจำ
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h).strip() if h is not None else None for h in header]
+        for values in rows:
+            if all(v is None for v in values):
+                continue
+            yield _clean(dict(zip(header, values)))
+    finally:
+        workbook.close()
+
+
+def iter_file_rows(file: BinaryIO, filename: str) -> Iterator[dict]:
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return iter_xlsx_rows(file)
+    return iter_csv_rows(file)
+
+
+def import_rows(db: Session, kind: str, rows: Iterable[dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                on_chunk: Optional[Callable[[ImportProgress], None]] = None) -> ImportProgress:
+    """Validate and upsert rows chunk by chunk, committing each chunk.
+
+    Rows are upserted on their natural key, so importing the same file again
+    updates the same records instead of duplicating them.
+    """
+    table = INGEST_TABLES[kind]
+    progress = ImportProgress()
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        # index ของข้อผิดพลาดนับจากแถวข้อมูลแรกของไฟล์ (ไม่รวมหัวตาราง)
+        valid, errors = validate_rows(db, table, chunk, offset=progress.rows)
+        result = IngestResult(errors=errors)
+        try:
+            upsert_rows(db, table, valid, result)
+            refresh_features(db, table, result)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        progress.add(len(chunk), result)
+        logger.info("Imported %d %s rows (%d inserted, %d updated, %d errors)",
+                    progress.rows, kind, progress.inserted, progress.updated, progress.error_count)
+        if on_chunk:
+            on_chunk(progress)
+    return progress
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import historical meter data from CSV/XLSX")
+    parser.add_argument("kind", choices=sorted(INGEST_TABLES))
+    parser.add_argument("path")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    import logging_config
+
+    logging_config.setup_logging()
+
+    from database import SessionLocal
+
+    def report(progress: ImportProgress):
+        print(f"\r{progress.rows} rows  {progress.inserted} inserted  {progress.updated} updated  "
+              f"{progress.error_count} errors", end="", file=sys.stderr, flush=True)
+
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as f:
+            progress = import_rows(db, args.kind, iter_file_rows(f, args.path), args.chunk_size, report)
+    finally:
+        db.close()
+    print(file=sys.stderr)
+    for error in progress.errors:
+        print(f"row {error['index']}: {error['detail']}", file=sys.stderr)
+    return 1 if progress.error_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
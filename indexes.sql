@@ -0,0 +1,31 @@
+-- Composite indexes and the prediction natural key declared in models.py.
+-- Run once against an existing efsdata database (MySQL / MariaDB).
+
+START TRANSACTION;
+
+-- ลบแถวพยากรณ์ที่ซ้ำกันก่อนสร้าง unique key (เก็บแถวที่ id น้อยที่สุดไว้)
+DELETE p1 FROM `predictiontable` p1
+  JOIN `predictiontable` p2
+    ON p1.`building` = p2.`building`
+   AND p1.`modelName` = p2.`modelName`
+   AND p1.`year_current` = p2.`year_current`
+   AND p1.`month_current` = p2.`month_current`
+   AND p1.`id` > p2.`id`;
+
+ALTER TABLE `predictiontable`
+  ADD UNIQUE KEY `uq_prediction_natural_key` (`building`, `modelName`, `year_current`, `month_current`),
+  ADD KEY `ix_prediction_period` (`year_current`, `month_current`, `modelName`);
+
+ALTER TABLE `unit`
+  ADD KEY `ix_unit_period_building` (`years`, `month`, `idBuilding`);
+
+ALTER TABLE `numberofusers`
+  ADD KEY `ix_numberofusers_period` (`years`, `month`);
+
+ALTER TABLE `examstatus`
+  ADD KEY `ix_examstatus_period` (`years`, `month`);
+
+ALTER TABLE `semesterstatus`
+  ADD KEY `ix_semesterstatus_period` (`years`, `month`);
+
+COMMIT;
@@ -0,0 +1,127 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.orm import Session
+
+import config
+import feature_store
+from bulk import insert_rows
+from models import Building, ExamStatus, NumberOfUsers, SemesterStatus, Unit
+from schemas import ExamStatusCreate, NumberOfUsersCreate, SemesterStatusCreate, UnitCreate
+
+
+@dataclass(frozen=True)
+class IngestTable:
+    model: type
+    schema: type
+    key_columns: Tuple[str, ...]
+    value_columns: Tuple[str, ...]
+
+
+# ตารางข้อมูลรายเดือนที่นำเข้าแบบเป็นชุดได้ คีย์ตามธรรมชาติคือ (years, month[, idBuilding])
+INGEST_TABLES: Dict[str, IngestTable] = {
+    "units": IngestTable(Unit, UnitCreate, ("years", "month", "idBuilding"), ("amount",)),
+    "numberOfUsers": IngestTable(NumberOfUsers, NumberOfUsersCreate, ("years", "month"), ("amount",)),
+    "examStatus": IngestTable(ExamStatus, ExamStatusCreate, ("years", "month"), ("status",)),
+    "semesterStatus": IngestTable(SemesterStatus, SemesterStatusCreate, ("years", "month"), ("status",)),
+}
+
+
+@dataclass
+class IngestResult:
+    inserted: int = 0
+    updated: int = 0
+    errors: List[dict] = field(default_factory=list)
+    # (years, month) ที่มีการเขียน ใช้ต่อสำหรับงานที่ต้องคำนวณใหม่ตามข้อมูลที่เปลี่ยน
+    periods: set = field(default_factory=set)
+    buildings: set = field(default_factory=set)
+
+    def as_dict(self) -> dict:
+        return {"inserted": self.inserted, "updated": self.updated, "errors": self.errors}
+
+
+def _error_detail(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+def validate_rows(db: Session, table: IngestTable, items: List[dict], offset: int = 0) -> Tuple[List[dict], List[dict]]:
+    """Validate a batch in one pass; returns (rows keyed by column, per-row errors)."""
+    rows: Dict[tuple, dict] = {}
+    positions: Dict[tuple, int] = {}
+    errors = []
+
+    for index, item in enumerate(items, start=offset):
+        try:
+            parsed: BaseModel = item if isinstance(item, table.schema) else table.schema.model_validate(item)
+        except ValidationError as error:
+            errors.append({"index": index, "detail": _error_detail(error)})
+            continue
+        row = parsed.model_dump()
+        if not 1 <= row["month"] <= 12:
+            errors.append({"index": index, "detail": "month: must be between 1 and 12"})
+            continue
+        key = tuple(row[c] for c in table.key_columns)
+        if key in rows:
+            errors.append({"index": index, "detail": f"duplicate of row {positions[key]} for key {key}"})
+            continue
+        rows[key] = row
+        positions[key] = index
+
+    if "idBuilding" in table.key_columns and rows:
+        ids = {row["idBuilding"] for row in rows.values()}
+        known = {building_id for (building_id,) in db.query(Building.id).filter(Building.id.in_(ids))}
+        for key in [key for key, row in rows.items() if row["idBuilding"] not in known]:
+            errors.append({"index": positions[key], "detail": f"idBuilding: building {key[2]} not found"})
+            del rows[key]
+
+    errors.sort(key=lambda e: e["index"])
+    return list(rows.values()), errors
+
+
+def upsert_rows(db: Session, table: IngestTable, rows: List[dict], result: IngestResult) -> None:
+    """Upsert rows on the table's unique natural key in one statement (no commit)."""
+    if not rows:
+        return
+    model = table.model
+    key_columns = [getattr(model, c) for c in table.key_columns]
+    years = {row["years"] for row in rows}
+
+    # อ่านคีย์ที่มีอยู่แล้วเพื่อนับ inserted/updated เท่านั้น การเขียนจริงใช้ upsert ของฐานข้อมูล
+    # request ที่ส่งพร้อมกันจึงไม่สร้างแถวซ้ำ (อย่างมากแค่ตัวเลขที่นับคลาดไป)
+    existing = {tuple(record) for record in db.query(*key_columns).filter(model.years.in_(years))}
+
+    for row in rows:
+        if tuple(row[c] for c in table.key_columns) in existing:
+            result.updated += 1
+        else:
+            result.inserted += 1
+        result.periods.add((row["years"], row["month"]))
+        if "idBuilding" in row:
+            result.buildings.add(row["idBuilding"])
+
+    insert_rows(db, model, rows, conflict_keys=table.key_columns, update_columns=table.value_columns)
+
+
+def refresh_features(db: Session, table: IngestTable, result: IngestResult) -> None:
+    # ข้อมูลรายอาคารคำนวณใหม่เฉพาะอาคารที่เปลี่ยน ข้อมูลระดับวิทยาเขตกระทบทุกอาคาร
+    if not config.FEATURE_STORE or not result.periods:
+        return
+    building_ids = result.buildings if "idBuilding" in table.key_columns else None
+    feature_store.refresh(db, result.periods, building_ids)
+
+
+def ingest(db: Session, kind: str, items: List[dict], all_or_nothing: bool = False) -> IngestResult:
+    table = INGEST_TABLES[kind]
+    rows, errors = validate_rows(db, table, items)
+    result = IngestResult(errors=errors)
+    if errors and all_or_nothing:
+        return result
+    try:
+        upsert_rows(db, table, rows, result)
+        refresh_features(db, table, result)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
@@ -0,0 +1,50 @@
+-- Natural keys for the monthly input tables declared in models.py, so bulk/import can
+-- upsert with ON DUPLICATE KEY UPDATE instead of select-then-insert.
+-- Run once against an existing efsdata database (MySQL / MariaDB) after indexes.sql.
+
+START TRANSACTION;
+
+-- ลบแถวที่ซ้ำกันก่อนสร้าง unique key (เก็บแถวที่ id น้อยที่สุดไว้ ตรงกับที่ .first() เคยอ่าน)
+DELETE u1 FROM `unit` u1
+  JOIN `unit` u2
+    ON u1.`years` = u2.`years`
+   AND u1.`month` = u2.`month`
+   AND u1.`idBuilding` = u2.`idBuilding`
+   AND u1.`id` > u2.`id`;
+
+DELETE n1 FROM `numberofusers` n1
+  JOIN `numberofusers` n2
+    ON n1.`years` = n2.`years`
+   AND n1.`month` = n2.`month`
+   AND n1.`id` > n2.`id`;
+
+DELETE e1 FROM `examstatus` e1
+  JOIN `examstatus` e2
+    ON e1.`years` = e2.`years`
+   AND e1.`month` = e2.`month`
+   AND e1.`id` > e2.`id`;
+
+DELETE s1 FROM `semesterstatus` s1
+  JOIN `semesterstatus` s2
+    ON s1.`years` = s2.`years`
+   AND s1.`month` = s2.`month`
+   AND s1.`id` > s2.`id`;
+
+-- unique key ใช้ค้นตามงวดแทน index เดิมได้ จึงลบ index เดิมออก
+ALTER TABLE `unit`
+  DROP INDEX `ix_unit_period_building`,
+  ADD UNIQUE KEY `uq_unit_period_building` (`years`, `month`, `idBuilding`);
+
+ALTER TABLE `numberofusers`
+  DROP INDEX `ix_numberofusers_period`,
+  ADD UNIQUE KEY `uq_numberofusers_period` (`years`, `month`);
+
+ALTER TABLE `examstatus`
+  DROP INDEX `ix_examstatus_period`,
+  ADD UNIQUE KEY `uq_examstatus_period` (`years`, `month`);
+
+ALTER TABLE `semesterstatus`
+  DROP INDEX `ix_semesterstatus_period`,
+  ADD UNIQUE KEY `uq_semesterstatus_period` (`years`, `month`);
+
+COMMIT;
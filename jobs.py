@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+import config
+import forecast_service
+from model_registry import registry
+from predict import parse_model_names
+from schemas import PredictionRequest, PredictionResponse
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# (year, month, models, เวอร์ชันโมเดล) งานที่ส่งก่อน promote จึงไม่ถูกใช้ตอบคำขอหลัง promote
+JobKey = Tuple[int, int, Tuple[str, ...], str]
+
+# ช่วงเวลาที่ long-poll ตรวจว่างานเสร็จหรือยัง
+WAIT_POLL_SECONDS = 0.1
+
+
+def _as_response_dict(row) -> dict:
+    # แปลงทั้ง dict จาก predict() และแถวจาก predictiontable ให้อยู่ในรูปแบบเดียวกับ PredictionResponse
+    if not isinstance(row, dict):
+        row = {name: getattr(row, name) for name in PredictionResponse.model_fields}
+    return PredictionResponse(**row).model_dump()
+
+
+@dataclass
+class ForecastJob:
+    id: str
+    key: JobKey
+    request: PredictionRequest
+    status: str = QUEUED
+    done: int = 0
+    total: int = 0
+    horizons_done: List[str] = field(default_factory=list)
+    result: Optional[List[dict]] = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    finished: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def on_progress(self, model_name: str, done: int, total: int) -> None:
+        self.horizons_done.append(model_name)
+        self.done = done
+        self.total = total
+
+    def snapshot(self, include_result: bool = False) -> dict:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "year": self.key[0],
+            "month": self.key[1],
+            "models": list(self.key[2]),
+            "model_version": self.key[3],
+            "progress": {
+                "done": self.done,
+                "total": self.total,
+                "horizons_done": list(self.horizons_done),
+            },
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+        if include_result and self.status == DONE:
+            data["result"] = self.result
+        return data
+
+
+class ForecastJobQueue:
+    """In-process forecast queue served by background threads (no external broker).
+
+    Submitting a (year, month, models) key that is already queued or running
+    returns the existing job instead of starting a second forecast.
+    """
+
+    def __init__(self, session_factory: Callable, workers: int = config.JOB_WORKERS,
+                 max_finished: int = config.JOB_HISTORY):
+        self.session_factory = session_factory
+        self.workers = max(1, workers)
+        self.max_finished = max_finished
+        self._queue: "queue.Queue[Optional[ForecastJob]]" = queue.Queue()
+        self._jobs: "OrderedDict[str, ForecastJob]" = OrderedDict()
+        self._active: Dict[JobKey, ForecastJob] = {}
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, request: PredictionRequest) -> ForecastJob:
+        key = (request.year, request.month, tuple(parse_model_names(request.modelName)), registry.serving_version())
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            job = ForecastJob(id=uuid.uuid4().hex, key=key, request=request)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._ensure_workers()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ForecastJob]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[ForecastJob]:
+        # รอใน event loop ด้วย asyncio.sleep ไม่ถือ thread ของ threadpool ไว้ระหว่างรอ
+        # (Event.wait ใน endpoint แบบ sync ทำให้ client ที่ long-poll หลายสิบรายแย่ง thread กับ endpoint อื่น)
+        job = self.get(job_id)
+        if job is None:
+            return None
+        deadline = time.monotonic() + timeout
+        while not job.finished.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(WAIT_POLL_SECONDS, remaining))
+        return job
+
+    def shutdown(self) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout=5)
+
+    def _ensure_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"forecast-job-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._run(job)
+
+    def _run(self, job: ForecastJob) -> None:
+        job.status = RUNNING
+        job.started_at = datetime.now()
+        db = self.session_factory()
+        try:
+            rows = forecast_service.predict_or_fetch(job.request, db, progress=job.on_progress, model_version=job.key[3])
+            job.result = [_as_response_dict(row) for row in rows]
+            job.done = job.total = max(job.total, len(job.result))
+            job.status = DONE
+        except HTTPException as error:
+            job.error = str(error.detail)
+            job.status = FAILED
+        except Exception as error:
+            logger.exception("Forecast job %s failed", job.id)
+            job.error = str(error)
+            job.status = FAILED
+        finally:
+            db.close()
+            job.finished_at = datetime.now()
+            with self._lock:
+                self._active.pop(job.key, None)
+                self._evict()
+            job.finished.set()
+
+    def _evict(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished.is_set()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
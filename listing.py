@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query, Session
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+STREAM_BATCH = 1000
+FORMATS = ("json", "ndjson", "csv")
+
+
+def period_filter(query: Query, years_column, month_column, year_from: Optional[int], month_from: Optional[int],
+                  year_to: Optional[int], month_to: Optional[int]) -> Query:
+    # ช่วงเวลาแบบ (ปี, เดือน) เขียนเป็นเงื่อนไขธรรมดาเพื่อให้ใช้ index (years, month) ได้ทุกฐานข้อมูล
+    if year_from is not None:
+        if month_from is None:
+            query = query.filter(years_column >= year_from)
+        else:
+            query = query.filter(or_(years_column > year_from, and_(years_column == year_from, month_column >= month_from)))
+    if year_to is not None:
+        if month_to is None:
+            query = query.filter(years_column <= year_to)
+        else:
+            query = query.filter(or_(years_column < year_to, and_(years_column == year_to, month_column <= month_to)))
+    return query
+
+
+def keyset_page(query: Query, id_column, after_id: Optional[int], limit: int) -> dict:
+    """One page ordered by id; pass next_after_id back as after_id for the next page."""
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    rows = query.order_by(id_column).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    items = [row._asdict() for row in rows[:limit]]
+    return {
+        "items": items,
+        "next_after_id": items[-1][id_column.key] if has_more else None,
+    }
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row._asdict(), default=str, ensure_ascii=False) + "\n"
+
+
+def _csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % STREAM_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_rows(session_factory: Callable[[], Session], build_query: Callable[[Session], Query], id_column,
+                after_id: Optional[int], fmt: str, filename: str) -> StreamingResponse:
+    """Stream every matching row as NDJSON or CSV without materializing the result."""
+    def generate():
+        # ใช้ session ของตัวเอง เพราะ session จาก Depends(get_db) อาจถูกปิดก่อนส่ง response เสร็จ
+        db = session_factory()
+        try:
+            query = build_query(db)
+            if after_id is not None:
+                query = query.filter(id_column > after_id)
+            rows = query.order_by(id_column).yield_per(STREAM_BATCH)
+            if fmt == "csv":
+                yield from _csv_lines(rows, [c["name"] for c in query.column_descriptions])
+            else:
+                yield from _ndjson_lines(rows)
+        finally:
+            db.close()
+
+    if fmt == "csv":
+        return StreamingResponse(generate(), media_type="text/csv",
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'})
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+def list_response(db: Session, session_factory: Callable[[], Session], build_query: Callable[[Session], Query],
+                  id_column, after_id: Optional[int], limit: int, fmt: str, filename: str):
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    if fmt == "json":
+        return keyset_page(build_query(db), id_column, after_id, limit)
+    return stream_rows(session_factory, build_query, id_column, after_id, fmt, filename)
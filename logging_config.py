@@ -0,0 +1,137 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from typing import Optional
+
+import config
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+# attribute มาตรฐานของ LogRecord ที่เหลือคือค่าที่ส่งมาทาง extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+# คิวข้าม process ที่ worker ของ process pool ส่ง log มาให้ process นี้เขียน
+_worker_queue = None
+_worker_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per line; values passed with ``extra=`` become fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+def _parse_levels(spec: str) -> dict:
+    # รูปแบบ "predict=DEBUG,sqlalchemy.engine=WARNING"
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _file_handler() -> logging.Handler:
+    os.makedirs(config.LOG_DIR, exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        os.path.join(config.LOG_DIR, config.LOG_FILE),
+        maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUPS,
+        encoding="utf-8",
+        delay=True,
+    )
+    handler.setFormatter(JsonFormatter() if config.LOG_JSON else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def setup_logging() -> None:
+    """Route all logging through a queue to a background thread that writes the rotating log file.
+
+    Safe to call more than once; only the first call installs handlers.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        _queue_handler = logging.handlers.QueueHandler(records)
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(config.LOG_LEVEL.upper())
+        for name, level in _parse_levels(config.LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = logging.handlers.QueueListener(records, _file_handler(), respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener, _worker_listener
+    with _lock:
+        if _worker_listener is not None:
+            _worker_listener.stop()
+            _worker_listener = None
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def worker_log_queue(context):
+    """Queue for pool worker processes (see setup_worker_logging); None if logging is not set up here."""
+    global _worker_queue, _worker_listener
+    with _lock:
+        if _listener is None:
+            return None
+        if _worker_queue is None:
+            _worker_queue = context.Queue()
+            _worker_listener = logging.handlers.QueueListener(_worker_queue, *_listener.handlers,
+                                                              respect_handler_level=True)
+            _worker_listener.start()
+        return _worker_queue
+
+
+def setup_worker_logging(log_queue) -> None:
+    # worker ไม่เปิดไฟล์ log เอง (หลาย process rotate ไฟล์เดียวกันไม่ได้) แต่ส่ง record กลับไปให้ process หลักเขียน
+    if log_queue is None:
+        return
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(config.LOG_LEVEL.upper())
+    for name, level in _parse_levels(config.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+
+def _after_fork_in_child() -> None:
+    # process ลูก (process pool) ไม่มี thread เขียน log ต่อมาจากแม่ จึงเริ่ม listener ของตัวเองด้วยคิวใหม่
+    global _listener, _worker_queue, _worker_listener
+    _worker_queue = _worker_listener = None
+    if _listener is None or _queue_handler is None:
+        return
+    records = queue.SimpleQueue()
+    _queue_handler.queue = records
+    _listener = logging.handlers.QueueListener(records, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
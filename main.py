@@ -1,27 +1,43 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from typing import List
-from database import Base
+from fastapi import FastAPI, Depends, File, HTTPException, Query, UploadFile
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import database
+from database import Base, SessionLocal, engine, pool_stats
 from models import Building, PredictionTable, Unit, NumberOfUsers, ExamStatus, SemesterStatus, Member
-from schemas import BuildingCreate, LoginData, UnitCreate, NumberOfUsersCreate, ExamStatusCreate, SemesterStatusCreate, MemberCreate, PredictionRequest, PredictionResponse
-from predict import predict
+from schemas import BuildingCreate, LoginData, LoginResponse, UnitCreate, NumberOfUsersCreate, ExamStatusCreate, SemesterStatusCreate, MemberCreate, PredictionRequest, PredictionResponse, BulkResult, UnitBulk, NumberOfUsersBulk, ExamStatusBulk, SemesterStatusBulk, RollingForecastRequest, BacktestRequest
+from ingest import INGEST_TABLES, ingest
+from importer import DEFAULT_CHUNK_SIZE, import_rows, iter_file_rows
+import feature_store
+from listing import DEFAULT_LIMIT, MAX_LIMIT, list_response, period_filter
+import forecast_service
+import rolling
+import backtest
+import analytics
+from jobs import ForecastJobQueue
+import model_registry
+from model_registry import registry
+import forecast_pool
+import config
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.backends import default_backend
-import os
-import base64
-
-
-
-DATABASE_URL = "mysql+pymysql://root:@localhost/efsdata"
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from fastapi.concurrency import run_in_threadpool
+from security import (
+    get_current_session, hash_password_async, issue_session_token, needs_rehash, verify_password_async,
+)
+import security
+import logging_config
+import metrics
+import response_cache
+import fast_json
+import time
+from fastapi import Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.exc import IntegrityError
+
+logging_config.setup_logging()
 
 app = FastAPI()
+job_queue = ForecastJobQueue(SessionLocal)
 origins = [
     "http://localhost:3000",  # React frontend ที่รันอยู่บน localhost:3000
     "http://127.0.0.1:3000",   # หรือใช้ localhost ที่มี IP 127.0.0.1
@@ -34,6 +50,29 @@ def get_db():
     finally:
         db.close()
 
+# เวลาตอบและจำนวน query ต่อ request แยกตาม route template (เช่น /buildings/{building_id}) ไม่ใช่ path จริง
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    counter, token = metrics.start_request_queries()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.stop_request_queries(token)
+        route = request.scope.get("route")
+        route = getattr(route, "path", "unmatched")
+        metrics.REQUESTS.inc(method=request.method, route=route, status=status)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route)
+        metrics.REQUEST_QUERIES.observe(counter[0], method=request.method, route=route)
+
+# ข้อมูลรายเดือนมี unique key ตามงวด (ingest_keys.sql) การสร้าง/แก้ให้ซ้ำงวดเดิมจึงตอบ 409 แทน 500
+@app.exception_handler(IntegrityError)
+async def integrity_error_handler(request: Request, exc: IntegrityError):
+    return JSONResponse(status_code=409, content={"detail": "A record with the same key already exists"})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # หรือระบุ domain ของ frontend ถ้าไม่อยากอนุญาตทั้งหมด
@@ -43,33 +82,6 @@ app.add_middleware(
 )
 
 
-def hash_password(password: str) -> str:
-    salt = os.urandom(16)
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100000,
-        backend=default_backend()
-    )
-    key = base64.urlsafe_b64encode(kdf.derive(password.encode('utf-8')))
-    return f"{base64.urlsafe_b64encode(salt).decode('utf-8')}:{key.decode('utf-8')}"
-
-
-def verify_password(stored_password, provided_password):
-    salt, key = stored_password.split(":")
-    salt = base64.urlsafe_b64decode(salt)
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100000,
-        backend=default_backend()
-    )
-    return key == base64.urlsafe_b64encode(kdf.derive(provided_password.encode('utf-8'))).decode('utf-8')
-
-
-
 Base.metadata.create_all(bind=engine)
 
 # Dependency
@@ -81,20 +93,23 @@ def get_db():
         db.close()
 
 # CRUD for Building
+# การเขียนข้อมูลรายเดือน/พื้นที่อาคารจะอัปเดต featurestore ใน transaction เดียวกัน (feature_store.refresh_record ก่อน commit)
 @app.post("/buildings/", response_model=BuildingCreate)
 def create_building(building: BuildingCreate, db: Session = Depends(get_db)):
-    db_building = Building(code=building.code, name=building.name, area=building.area)
+    db_building = Building(code=building.code, name=building.name, area=building.area, idGroup=building.idGroup)
     db.add(db_building)
     db.commit()
     db.refresh(db_building)
     return db_building
 
 @app.get("/buildings/{building_id}", response_model=BuildingCreate)
-def read_building(building_id: int, db: Session = Depends(get_db)):
-    db_building = db.query(Building).filter(Building.id == building_id).first()
-    if db_building is None:
-        raise HTTPException(status_code=404, detail="Building not found")
-    return db_building
+def read_building(building_id: int, request: Request, db: Session = Depends(get_db)):
+    def load():
+        db_building = db.query(Building).filter(Building.id == building_id).first()
+        if db_building is None:
+            raise HTTPException(status_code=404, detail="Building not found")
+        return BuildingCreate.model_validate(db_building, from_attributes=True)
+    return response_cache.respond(request, ("building", building_id), ("building",), load)
 
 @app.put("/buildings/{building_id}", response_model=BuildingCreate)
 def update_building(building_id: int, building: BuildingCreate, db: Session = Depends(get_db)):
@@ -104,6 +119,8 @@ def update_building(building_id: int, building: BuildingCreate, db: Session = De
     db_building.code = building.code
     db_building.name = building.name
     db_building.area = building.area
+    db_building.idGroup = building.idGroup
+    feature_store.refresh_record(db, db_building)
     db.commit()
     db.refresh(db_building)
     return db_building
@@ -114,6 +131,7 @@ def delete_building(building_id: int, db: Session = Depends(get_db)):
     if db_building is None:
         raise HTTPException(status_code=404, detail="Building not found")
     db.delete(db_building)
+    feature_store.refresh_record(db, db_building)
     db.commit()
     return {"detail": "Building deleted"}
 
@@ -122,16 +140,19 @@ def delete_building(building_id: int, db: Session = Depends(get_db)):
 def create_unit(unit: UnitCreate, db: Session = Depends(get_db)):
     db_unit = Unit(years=unit.years, month=unit.month, amount=unit.amount, idBuilding=unit.idBuilding)
     db.add(db_unit)
+    feature_store.refresh_record(db, db_unit)
     db.commit()
     db.refresh(db_unit)
     return db_unit
 
 @app.get("/units/{unit_id}", response_model=UnitCreate)
-def read_unit(unit_id: int, db: Session = Depends(get_db)):
-    db_unit = db.query(Unit).filter(Unit.id == unit_id).first()
-    if db_unit is None:
-        raise HTTPException(status_code=404, detail="Unit not found")
-    return db_unit
+def read_unit(unit_id: int, request: Request, db: Session = Depends(get_db)):
+    def load():
+        db_unit = db.query(Unit).filter(Unit.id == unit_id).first()
+        if db_unit is None:
+            raise HTTPException(status_code=404, detail="Unit not found")
+        return UnitCreate.model_validate(db_unit, from_attributes=True)
+    return response_cache.respond(request, ("unit", unit_id), ("unit",), load)
 
 @app.put("/units/{unit_id}", response_model=UnitCreate)
 def update_unit(unit_id: int, unit: UnitCreate, db: Session = Depends(get_db)):
@@ -142,6 +163,7 @@ def update_unit(unit_id: int, unit: UnitCreate, db: Session = Depends(get_db)):
     db_unit.month = unit.month
     db_unit.amount = unit.amount
     db_unit.idBuilding = unit.idBuilding
+    feature_store.refresh_record(db, db_unit)
     db.commit()
     db.refresh(db_unit)
     return db_unit
@@ -152,6 +174,7 @@ def delete_unit(unit_id: int, db: Session = Depends(get_db)):
     if db_unit is None:
         raise HTTPException(status_code=404, detail="Unit not found")
     db.delete(db_unit)
+    feature_store.refresh_record(db, db_unit)
     db.commit()
     return {"detail": "Unit deleted"}
 
@@ -160,6 +183,7 @@ def delete_unit(unit_id: int, db: Session = Depends(get_db)):
 def create_number_of_users(number_of_users: NumberOfUsersCreate, db: Session = Depends(get_db)):
     db_number_of_users = NumberOfUsers(years=number_of_users.years, month=number_of_users.month, amount=number_of_users.amount)
     db.add(db_number_of_users)
+    feature_store.refresh_record(db, db_number_of_users)
     db.commit()
     db.refresh(db_number_of_users)
     return db_number_of_users
@@ -179,6 +203,7 @@ def update_number_of_users(number_of_users_id: int, number_of_users: NumberOfUse
     db_number_of_users.years = number_of_users.years
     db_number_of_users.month = number_of_users.month
     db_number_of_users.amount = number_of_users.amount
+    feature_store.refresh_record(db, db_number_of_users)
     db.commit()
     db.refresh(db_number_of_users)
     return db_number_of_users
@@ -189,6 +214,7 @@ def delete_number_of_users(number_of_users_id: int, db: Session = Depends(get_db
     if db_number_of_users is None:
         raise HTTPException(status_code=404, detail="Number of users not found")
     db.delete(db_number_of_users)
+    feature_store.refresh_record(db, db_number_of_users)
     db.commit()
     return {"detail": "Number of users deleted"}
 
@@ -197,6 +223,7 @@ def delete_number_of_users(number_of_users_id: int, db: Session = Depends(get_db
 def create_exam_status(exam_status: ExamStatusCreate, db: Session = Depends(get_db)):
     db_exam_status = ExamStatus(years=exam_status.years, month=exam_status.month, status=exam_status.status)
     db.add(db_exam_status)
+    feature_store.refresh_record(db, db_exam_status)
     db.commit()
     db.refresh(db_exam_status)
     return db_exam_status
@@ -216,6 +243,7 @@ def update_exam_status(exam_status_id: int, exam_status: ExamStatusCreate, db: S
     db_exam_status.years = exam_status.years
     db_exam_status.month = exam_status.month
     db_exam_status.status = exam_status.status
+    feature_store.refresh_record(db, db_exam_status)
     db.commit()
     db.refresh(db_exam_status)
     return db_exam_status
@@ -226,6 +254,7 @@ def delete_exam_status(exam_status_id: int, db: Session = Depends(get_db)):
     if db_exam_status is None:
         raise HTTPException(status_code=404, detail="Exam status not found")
     db.delete(db_exam_status)
+    feature_store.refresh_record(db, db_exam_status)
     db.commit()
     return {"detail": "Exam status deleted"}
 
@@ -234,6 +263,7 @@ def delete_exam_status(exam_status_id: int, db: Session = Depends(get_db)):
 def create_semester_status(semester_status: SemesterStatusCreate, db: Session = Depends(get_db)):
     db_semester_status = SemesterStatus(years=semester_status.years, month=semester_status.month, status=semester_status.status)
     db.add(db_semester_status)
+    feature_store.refresh_record(db, db_semester_status)
     db.commit()
     db.refresh(db_semester_status)
     return db_semester_status
@@ -253,6 +283,7 @@ def update_semester_status(semester_status_id: int, semester_status: SemesterSta
     db_semester_status.years = semester_status.years
     db_semester_status.month = semester_status.month
     db_semester_status.status = semester_status.status
+    feature_store.refresh_record(db, db_semester_status)
     db.commit()
     db.refresh(db_semester_status)
     return db_semester_status
@@ -263,17 +294,53 @@ def delete_semester_status(semester_status_id: int, db: Session = Depends(get_db
     if db_semester_status is None:
         raise HTTPException(status_code=404, detail="Semester status not found")
     db.delete(db_semester_status)
+    feature_store.refresh_record(db, db_semester_status)
     db.commit()
     return {"detail": "Semester status deleted"}
 
+# Bulk upsert สำหรับนำเข้าข้อมูลรายเดือน: ตรวจทุกแถวในรอบเดียว แล้วเขียนใน transaction เดียว
+# แถวที่ (years, month[, idBuilding]) มีอยู่แล้วจะถูกอัปเดตแทนการเพิ่มใหม่
+def _bulk_ingest(kind: str, items: list, all_or_nothing: bool, db: Session):
+    result = ingest(db, kind, items, all_or_nothing=all_or_nothing)
+    return result.as_dict()
+
+@app.post("/units/bulk", response_model=BulkResult)
+def bulk_units(items: UnitBulk, all_or_nothing: bool = False, db: Session = Depends(get_db)):
+    return _bulk_ingest("units", items, all_or_nothing, db)
+
+@app.post("/numberOfUsers/bulk", response_model=BulkResult)
+def bulk_number_of_users(items: NumberOfUsersBulk, all_or_nothing: bool = False, db: Session = Depends(get_db)):
+    return _bulk_ingest("numberOfUsers", items, all_or_nothing, db)
+
+@app.post("/examStatus/bulk", response_model=BulkResult)
+def bulk_exam_status(items: ExamStatusBulk, all_or_nothing: bool = False, db: Session = Depends(get_db)):
+    return _bulk_ingest("examStatus", items, all_or_nothing, db)
+
+@app.post("/semesterStatus/bulk", response_model=BulkResult)
+def bulk_semester_status(items: SemesterStatusBulk, all_or_nothing: bool = False, db: Session = Depends(get_db)):
+    return _bulk_ingest("semesterStatus", items, all_or_nothing, db)
+
+# นำเข้าข้อมูลย้อนหลังจากไฟล์ CSV/XLSX แบบอ่านทีละก้อน (นำเข้าไฟล์เดิมซ้ำได้โดยไม่เกิดแถวซ้ำ)
+@app.post("/import/{kind}")
+def import_file(kind: str, file: UploadFile = File(...), chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=50000),
+                db: Session = Depends(get_db)):
+    if kind not in INGEST_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown import type: {kind}")
+    try:
+        progress = import_rows(db, kind, iter_file_rows(file.file, file.filename or ""), chunk_size)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return progress.as_dict()
+
 # CRUD for Member
 @app.post("/members/", response_model=MemberCreate)
-def create_member(member: MemberCreate, db: Session = Depends(get_db)):
-    db_user = db.query(Member).filter(Member.username == member.username).first()
+async def create_member(member: MemberCreate, db: Session = Depends(get_db)):
+    # งาน DB รันใน threadpool ส่วน PBKDF2 รันใน executor แยกที่จำกัดจำนวน thread ไว้
+    db_user = await run_in_threadpool(lambda: db.query(Member).filter(Member.username == member.username).first())
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
 
-    hashed_password = hash_password(member.password)
+    hashed_password = await hash_password_async(member.password)
 
     db_member = Member(
         username=member.username,
@@ -284,10 +351,14 @@ def create_member(member: MemberCreate, db: Session = Depends(get_db)):
         phone=member.phone,
         status=member.status
     )
-    db.add(db_member)
-    db.commit()
-    db.refresh(db_member)
-    return db_member
+
+    def save():
+        db.add(db_member)
+        db.commit()
+        db.refresh(db_member)
+        return MemberCreate.model_validate(db_member, from_attributes=True)
+
+    return await run_in_threadpool(save)
 
 @app.get("/members/{member_id}", response_model=MemberCreate)
 def read_member(member_id: int, db: Session = Depends(get_db)):
@@ -297,20 +368,27 @@ def read_member(member_id: int, db: Session = Depends(get_db)):
     return db_member
 
 @app.put("/members/{member_id}", response_model=MemberCreate)
-def update_member(member_id: int, member: MemberCreate, db: Session = Depends(get_db)):
-    db_member = db.query(Member).filter(Member.id == member_id).first()
+async def update_member(member_id: int, member: MemberCreate, db: Session = Depends(get_db)):
+    db_member = await run_in_threadpool(lambda: db.query(Member).filter(Member.id == member_id).first())
     if db_member is None:
         raise HTTPException(status_code=404, detail="Member not found")
+
+    # hash รหัสผ่านใหม่แบบเดียวกับตอนสร้าง ถ้าส่งค่าเดิมที่ได้จาก GET กลับมา (เป็น hash อยู่แล้ว) ไม่เปลี่ยนรหัสผ่าน
+    if member.password != db_member.password:
+        db_member.password = await hash_password_async(member.password)
     db_member.username = member.username
-    db_member.password = member.password
     db_member.fname = member.fname
     db_member.lname = member.lname
     db_member.email = member.email
     db_member.phone = member.phone
     db_member.status = member.status
-    db.commit()
-    db.refresh(db_member)
-    return db_member
+
+    def save():
+        db.commit()
+        db.refresh(db_member)
+        return MemberCreate.model_validate(db_member, from_attributes=True)
+
+    return await run_in_threadpool(save)
 
 @app.delete("/members/{member_id}")
 def delete_member(member_id: int, db: Session = Depends(get_db)):
@@ -322,57 +400,213 @@ def delete_member(member_id: int, db: Session = Depends(get_db)):
     return {"detail": "Member deleted"}
 
 @app.post("/login/")
-def login(data: LoginData, db: Session = Depends(get_db)):
-    db_user = db.query(Member).filter(Member.username == data.username).first()
-    if not db_user or not verify_password(db_user.password, data.password):
+async def login(data: LoginData, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(lambda: db.query(Member).filter(Member.username == data.username).first())
+    if not db_user or not await verify_password_async(db_user.password, data.password):
         raise HTTPException(status_code=400, detail="ชื่อผู้ใช้งานหรือรหัสผ่านไม่ถูกต้อง")
 
-    return {
+    user = {
         "user_id": db_user.id,
         "username": db_user.username,
         "status": db_user.status,
         "name": f"{db_user.fname} {db_user.lname}"
     }
 
+    # อัปเกรด hash ที่ใช้จำนวนรอบน้อยกว่าค่าปัจจุบัน
+    if needs_rehash(db_user.password):
+        db_user.password = await hash_password_async(data.password)
+        await run_in_threadpool(db.commit)
 
+    # token นี้ใช้แทนการส่งรหัสผ่านซ้ำในหน้าอื่น ๆ (Authorization: Bearer <token>)
+    return {
+        **user,
+        "token": issue_session_token(**user),
+        "expires_in": config.SESSION_TTL,
+    }
 
-
-def check_existing_prediction(db: Session, year: int, month: int):
-    existing_predictions = db.query(PredictionTable).filter_by(year_current=year, month_current=month).all()
-    return existing_predictions
-
-
-def save_prediction_to_db(db: Session, predictions: List[dict]):
-    for prediction in predictions:
-        new_record = PredictionTable(
-            building=prediction['building'],
-            area=prediction['area'],
-            prediction=prediction['prediction'],
-            unit=prediction['unit'],
-            modelName=prediction['modelName'],
-            month_current=prediction['month_current'],
-            year_current=prediction['year_current'],
-            month_predict=prediction['month_predict'],
-            year_predict=prediction['year_predict'],
+# ตรวจ token และคืนข้อมูลผู้ใช้ (endpoint อื่นยังไม่บังคับ token ดู security.get_current_session)
+@app.get("/session", response_model=LoginResponse)
+def read_session(session: dict = Depends(get_current_session)):
+    return session
+
+
+# รายการข้อมูลแบบแบ่งหน้า (keyset ตาม id) เลือกเฉพาะคอลัมน์ที่ใช้ ไม่โหลด ORM object ทั้งตัว
+# format=ndjson หรือ csv จะ stream ข้อมูลทั้งหมดที่ตรงเงื่อนไขสำหรับ export
+@app.get("/buildings/")
+def list_buildings(request: Request, code: Optional[str] = None, after_id: Optional[int] = None,
+                   limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), format: str = "json",
+                   db: Session = Depends(get_db)):
+    def build(session: Session):
+        query = session.query(Building.id, Building.code, Building.name, Building.area, Building.idGroup)
+        if code:
+            query = query.filter(Building.code == code)
+        return query
+    if format == "json":
+        return response_cache.respond(request, ("buildings", code, after_id, limit), ("building",),
+                                      lambda: list_response(db, SessionLocal, build, Building.id, after_id, limit, format, "buildings"))
+    return list_response(db, SessionLocal, build, Building.id, after_id, limit, format, "buildings")
+
+@app.get("/units/")
+def list_units(request: Request, building: Optional[int] = None, year_from: Optional[int] = None, month_from: Optional[int] = None,
+               year_to: Optional[int] = None, month_to: Optional[int] = None, after_id: Optional[int] = None,
+               limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), format: str = "json",
+               db: Session = Depends(get_db)):
+    def build(session: Session):
+        query = session.query(Unit.id, Unit.years, Unit.month, Unit.amount, Unit.idBuilding)
+        if building is not None:
+            query = query.filter(Unit.idBuilding == building)
+        return period_filter(query, Unit.years, Unit.month, year_from, month_from, year_to, month_to)
+    if format == "json":
+        key = ("units", building, year_from, month_from, year_to, month_to, after_id, limit)
+        return response_cache.respond(request, key, ("unit",),
+                                      lambda: list_response(db, SessionLocal, build, Unit.id, after_id, limit, format, "units"))
+    return list_response(db, SessionLocal, build, Unit.id, after_id, limit, format, "units")
+
+def _list_monthly(model, value_column, name: str, year_from, month_from, year_to, month_to, after_id, limit, format, db):
+    def build(session: Session):
+        query = session.query(model.id, model.years, model.month, value_column)
+        return period_filter(query, model.years, model.month, year_from, month_from, year_to, month_to)
+    return list_response(db, SessionLocal, build, model.id, after_id, limit, format, name)
+
+@app.get("/numberOfUsers/")
+def list_number_of_users(year_from: Optional[int] = None, month_from: Optional[int] = None, year_to: Optional[int] = None,
+                         month_to: Optional[int] = None, after_id: Optional[int] = None,
+                         limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), format: str = "json",
+                         db: Session = Depends(get_db)):
+    return _list_monthly(NumberOfUsers, NumberOfUsers.amount, "numberOfUsers",
+                         year_from, month_from, year_to, month_to, after_id, limit, format, db)
+
+@app.get("/examStatus/")
+def list_exam_status(year_from: Optional[int] = None, month_from: Optional[int] = None, year_to: Optional[int] = None,
+                     month_to: Optional[int] = None, after_id: Optional[int] = None,
+                     limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), format: str = "json",
+                     db: Session = Depends(get_db)):
+    return _list_monthly(ExamStatus, ExamStatus.status, "examStatus",
+                         year_from, month_from, year_to, month_to, after_id, limit, format, db)
+
+@app.get("/semesterStatus/")
+def list_semester_status(year_from: Optional[int] = None, month_from: Optional[int] = None, year_to: Optional[int] = None,
+                         month_to: Optional[int] = None, after_id: Optional[int] = None,
+                         limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), format: str = "json",
+                         db: Session = Depends(get_db)):
+    return _list_monthly(SemesterStatus, SemesterStatus.status, "semesterStatus",
+                         year_from, month_from, year_to, month_to, after_id, limit, format, db)
+
+@app.get("/members/")
+def list_members(after_id: Optional[int] = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                 format: str = "json", db: Session = Depends(get_db)):
+    # ไม่ส่ง hash รหัสผ่านออกไปในรายการ
+    def build(session: Session):
+        return session.query(Member.id, Member.username, Member.fname, Member.lname, Member.email, Member.phone, Member.status)
+    return list_response(db, SessionLocal, build, Member.id, after_id, limit, format, "members")
+
+@app.get("/predictions/")
+def list_predictions(year: Optional[int] = None, month: Optional[int] = None, model: Optional[str] = None,
+                     building: Optional[str] = None, model_version: Optional[str] = None, after_id: Optional[int] = None,
+                     limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), format: str = "json",
+                     db: Session = Depends(get_db)):
+    def build(session: Session):
+        query = session.query(
+            PredictionTable.id, PredictionTable.building, PredictionTable.area, PredictionTable.prediction,
+            PredictionTable.unit, PredictionTable.modelName, PredictionTable.month_current,
+            PredictionTable.year_current, PredictionTable.month_predict, PredictionTable.year_predict,
+            PredictionTable.model_version,
         )
-        db.add(new_record)
-    db.commit()
+        if year is not None:
+            query = query.filter(PredictionTable.year_current == year)
+        if month is not None:
+            query = query.filter(PredictionTable.month_current == month)
+        if model:
+            query = query.filter(PredictionTable.modelName.in_(model.split(",")))
+        if building is not None:
+            query = query.filter(PredictionTable.building == building)
+        if model_version is not None:
+            query = query.filter(PredictionTable.model_version == model_version)
+        return query
+    return list_response(db, SessionLocal, build, PredictionTable.id, after_id, limit, format, "predictions")
 
 
 @app.post("/predict-or-fetch", response_model=List[PredictionResponse])  # กำหนด response model ให้เป็น List[PredictionResponse]
-def predict_or_fetch(request: PredictionRequest, db: Session = Depends(get_db)) -> List[PredictionResponse]:
-    # ตรวจสอบว่ามีข้อมูลในฐานข้อมูลหรือไม่
-    existing_predictions = check_existing_prediction(db, request.year, request.month)
-    
-    if existing_predictions:
-        # ถ้ามีข้อมูลแล้วให้ดึงข้อมูลมาแสดง
-        return existing_predictions
-    else:
-        # ถ้าไม่มีข้อมูล ให้ทำการพยากรณ์
-        predictions = predict(request, db)
-        # บันทึกผลลัพธ์ลงในฐานข้อมูล
-        save_prediction_to_db(db, predictions)
-        return predictions
+def predict_or_fetch(request: PredictionRequest, format: str = "json", db: Session = Depends(get_db)) -> List[PredictionResponse]:
+    # format=rows/columnar: อ่านเฉพาะคอลัมน์ของ PredictionResponse แล้ว serialize ด้วย orjson ทีเดียว ไม่สร้าง model ทีละแถว
+    fast_json.check_format(format)
+    if format == "json":
+        return forecast_service.predict_or_fetch(request, db)
+    rows = forecast_service.predict_or_fetch(request, db, columns=fast_json.PREDICTION_COLUMNS)
+    return fast_json.FastJSONResponse(fast_json.prediction_payload(rows, format))
+
+
+# พยากรณ์ต่อเนื่องหลายเดือน (เกิน 12 เดือนได้) และเปรียบเทียบหลาย scenario เช่น จำนวนผู้ใช้ที่ต่างกัน
+@app.post("/rolling-forecast")
+def rolling_forecast(request: RollingForecastRequest, db: Session = Depends(get_db)):
+    return rolling.rolling_forecast(request, db)
+
+
+# สรุปผลพยากรณ์ที่บันทึกไว้ด้วย GROUP BY ในฐานข้อมูล (ใช้แทนการดึงทุกแถวไปรวมที่ frontend)
+# model_version ไม่ระบุ = เวอร์ชันที่ใช้พยากรณ์อยู่ (อยู่ใน key ของ cache เพราะ promote ไม่ได้เขียนตารางใด)
+_ANALYTICS_TABLES = ("predictiontable", "building", "groupbuilding")
+
+@app.get("/analytics/campus-total")
+def analytics_campus_total(request: Request, year: int = Query(...), month: int = Query(...), model: str = "All",
+                           model_version: Optional[str] = None, db: Session = Depends(get_db)):
+    version = model_version or registry.serving_version()
+    return response_cache.respond(request, ("analytics/campus-total", year, month, model, version), ("predictiontable",),
+                                  lambda: analytics.campus_totals(db, year, month, model, version))
+
+@app.get("/analytics/groups")
+def analytics_groups(request: Request, year: int = Query(...), month: int = Query(...), model: str = "All",
+                     model_version: Optional[str] = None, db: Session = Depends(get_db)):
+    version = model_version or registry.serving_version()
+    return response_cache.respond(request, ("analytics/groups", year, month, model, version), _ANALYTICS_TABLES,
+                                  lambda: analytics.group_totals(db, year, month, model, version))
+
+@app.get("/analytics/intensity")
+def analytics_intensity(request: Request, year: int = Query(...), month: int = Query(...), model: str = "T1",
+                        model_version: Optional[str] = None, db: Session = Depends(get_db)):
+    version = model_version or registry.serving_version()
+    return response_cache.respond(request, ("analytics/intensity", year, month, model, version), _ANALYTICS_TABLES,
+                                  lambda: analytics.energy_intensity(db, year, month, model, version))
+
+@app.get("/analytics/accuracy")
+def analytics_accuracy(request: Request, year_from: Optional[int] = None, month_from: Optional[int] = None,
+                       year_to: Optional[int] = None, month_to: Optional[int] = None, model: str = "All",
+                       by: str = "model", model_version: Optional[str] = None, db: Session = Depends(get_db)):
+    version = model_version or registry.serving_version()
+    key = ("analytics/accuracy", year_from, month_from, year_to, month_to, model, by, version)
+    return response_cache.respond(request, key, ("predictiontable", "unit"),
+                                  lambda: analytics.accuracy(db, year_from, month_from, year_to, month_to, model, by,
+                                                             version))
+
+
+# ทดสอบความแม่นยำย้อนหลัง: พยากรณ์ทุกเดือนในช่วงที่กำหนดแล้วเทียบกับค่าจริงในตาราง unit
+@app.post("/backtests")
+def create_backtest(request: BacktestRequest, db: Session = Depends(get_db)):
+    run_id = backtest.run_backtest(db, (request.year_from, request.month_from), (request.year_to, request.month_to),
+                                   request.modelName)
+    return backtest.get_backtest(db, run_id, scope="horizon")
+
+@app.get("/backtests")
+def list_backtests(limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db)):
+    return backtest.list_runs(db, limit)
+
+@app.get("/backtests/{run_id}")
+def read_backtest(run_id: int, scope: Optional[str] = None, building: Optional[int] = None,
+                  model: Optional[str] = None, db: Session = Depends(get_db)):
+    return backtest.get_backtest(db, run_id, scope, building, model)
+
+
+# พยากรณ์แบบ background: ส่งงานแล้วได้ job id กลับไปทันที จากนั้นค่อยถามสถานะ
+@app.post("/predict-jobs", status_code=202)
+def submit_prediction_job(request: PredictionRequest):
+    job = job_queue.submit(request)
+    return job.snapshot()
+
+@app.get("/predict-jobs/{job_id}")
+async def get_prediction_job(job_id: str, wait: float = Query(0, ge=0, le=30)):
+    job = await job_queue.wait(job_id, wait) if wait else job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.snapshot(include_result=True)
 
 def get_latest_year_month(db: Session):
     latest_entry = db.query(PredictionTable).order_by(PredictionTable.year_current.desc(), PredictionTable.month_current.desc()).first()
@@ -381,23 +615,96 @@ def get_latest_year_month(db: Session):
     else:
         return None, None  # หากไม่มีข้อมูลในฐานข้อมูล
     
+# dashboard เรียกซ้ำบ่อย: ตอบจาก response cache (ล้างเมื่อมีการเขียนตารางที่เกี่ยวข้อง) และตอบ 304 ถ้า ETag ตรงกัน
 @app.get("/current-month")
-def get_current_month(db: Session = Depends(get_db)):
-    latest_record = db.query(Unit).order_by(Unit.years.desc(), Unit.month.desc()).first()
-    if not latest_record:
-        raise HTTPException(status_code=404, detail="No data found")
-    return {"year": latest_record.years, "month": latest_record.month}
+def get_current_month(request: Request, db: Session = Depends(get_db)):
+    def load():
+        latest_record = db.query(Unit).order_by(Unit.years.desc(), Unit.month.desc()).first()
+        if not latest_record:
+            raise HTTPException(status_code=404, detail="No data found")
+        return {"year": latest_record.years, "month": latest_record.month}
+    return response_cache.respond(request, ("current-month",), ("unit",), load)
 
 @app.get("/check-predictions")
-def check_predictions(year: int = Query(...), month: int = Query(...), db: Session = Depends(get_db)):
-    predictions = db.query(PredictionTable).filter_by(year_current=year, month_current=month).all()
-    
-    if not predictions:
-        return []
-    
-    return predictions
+def check_predictions(request: Request, year: int = Query(...), month: int = Query(...), format: str = "json",
+                      db: Session = Depends(get_db)):
+    fast_json.check_format(format)
+    # ผลของเวอร์ชันโมเดลที่ใช้อยู่เท่านั้น หลัง promote key ของ cache เปลี่ยนตาม จึงไม่ได้ผลของเวอร์ชันเก่า
+    version = registry.serving_version()
+
+    def load():
+        if format == "json":
+            return db.query(PredictionTable).filter_by(year_current=year, month_current=month, model_version=version).all()
+        rows = forecast_service.check_existing_prediction(db, year, month, columns=fast_json.PREDICTION_COLUMNS,
+                                                          model_version=version)
+        return fast_json.prediction_payload(rows, format)
+    return response_cache.respond(request, ("check-predictions", year, month, format, version), ("predictiontable",), load)
+
+
+# โหลดโมเดล T1-T12 ไว้ในหน่วยความจำตั้งแต่เริ่มระบบ
+@app.on_event("startup")
+def warm_up_models():
+    registry.warm_up()
+    if config.FEATURE_STORE:
+        feature_store.ensure_table(engine)
+    backtest.ensure_tables(engine)
+
+@app.on_event("shutdown")
+def shutdown_forecast_pool():
+    job_queue.shutdown()
+    forecast_pool.shutdown()
+    security.shutdown()
+    logging_config.stop_logging()
+
+@app.get("/pool-stats")
+def get_pool_stats():
+    stats = {"sync": pool_stats(engine)}
+    if database.async_engine is not None:
+        stats["async"] = pool_stats(database.async_engine.sync_engine)
+    return stats
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# คำนวณ featurestore ใหม่ทั้งหมดจากตารางข้อมูลดิบ (เช่น หลังแก้ข้อมูลตรงในฐานข้อมูล)
+@app.post("/feature-store/rebuild")
+def rebuild_feature_store(db: Session = Depends(get_db)):
+    feature_store.ensure_table(engine)
+    try:
+        rows = feature_store.rebuild(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"rows": rows}
+
+@app.get("/models/loaded")
+def get_loaded_models():
+    return registry.loaded_versions()
+
+# เวอร์ชันโมเดลที่ train ด้วย training.py และการสลับเวอร์ชันที่ใช้พยากรณ์ (version=none คือกลับไปใช้ models/T*.pkl)
+# หลัง promote ผลพยากรณ์ที่บันทึกไว้ของเวอร์ชันเดิมยังอยู่ แต่ไม่ถูกส่งกลับ เดือนเหล่านั้นจะถูกพยากรณ์ใหม่ด้วยเวอร์ชันใหม่
+@app.get("/models/versions")
+def get_model_versions():
+    return model_registry.list_versions()
+
+@app.post("/models/versions/{version}/promote")
+def promote_model_version(version: str):
+    try:
+        model_registry.promote(None if version == "none" else version)
+    except FileNotFoundError as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    return {"active": registry.active_version()}
 
 
+# ใช้ endpoint แบบ async แทน CRUD และการอ่านผลพยากรณ์เมื่อ DB_MODE=async
+if config.DB_MODE == "async":
+    import async_routes
+    from database import async_engine
 
+    async_routes.install(app)
 
-    
\ No newline at end of file
+    @app.on_event("shutdown")
+    async def dispose_async_engine():
+        await async_engine.dispose()
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import config
+from config import BASE_VERSION
+from tree_eval import FLAT_SUFFIX, FlatTreeEnsemble, check_parity, flat_path_for
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = "models"
+# ไฟล์ที่ระบุเวอร์ชันที่ใช้งานอยู่ (เขียนโดย training.promote) ถ้าไม่มีจะใช้ models/T*.pkl เดิม
+CURRENT_POINTER = "CURRENT"
+VERSIONS_DIR = "versions"
+METADATA_FILE = "metadata.json"
+HORIZON_MODELS = [f"T{i}" for i in range(1, 13)]
+
+
+@dataclass
+class LoadedModel:
+    name: str
+    path: str
+    model: Any
+    mtime: float
+    size: int
+    sha256: str
+    loaded_at: datetime
+    backend: str = "sklearn"
+
+    def version(self) -> dict:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "sha256": self.sha256,
+            "size": self.size,
+            "mtime": datetime.fromtimestamp(self.mtime).isoformat(),
+            "loaded_at": self.loaded_at.isoformat(),
+            "backend": self.backend,
+        }
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Process-wide cache of the horizon models (T1-T12).
+
+    Each model is unpickled once and kept in memory. On every lookup the file
+    is stat()-ed; it is reloaded only when mtime/size changed *and* the content
+    hash differs from the one already loaded. With the "flat" backend the
+    estimator is converted to a FlatTreeEnsemble and only that is kept.
+    """
+
+    def __init__(self, model_dir: str = MODEL_DIR, backend: str = "sklearn"):
+        self.model_dir = model_dir
+        self.backend = backend
+        self._models: Dict[str, LoadedModel] = {}
+        self._lock = threading.Lock()
+        self._pointer: Optional[tuple] = None
+
+    def active_version(self) -> Optional[str]:
+        pointer = os.path.join(self.model_dir, CURRENT_POINTER)
+        try:
+            stat = os.stat(pointer)
+        except FileNotFoundError:
+            return None
+        # อ่านไฟล์ใหม่เฉพาะเมื่อถูกเปลี่ยน (promote ใช้ os.replace จึงเห็นทั้งไฟล์หรือไม่เห็นเลย)
+        cached = self._pointer
+        if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_ino):
+            return cached[1]
+        with open(pointer, encoding="utf-8") as f:
+            version = f.read().strip() or None
+        self._pointer = ((stat.st_mtime_ns, stat.st_ino), version)
+        return version
+
+    def serving_version(self) -> str:
+        # เวอร์ชันที่ใช้พยากรณ์อยู่ ผลพยากรณ์ที่บันทึกไว้ถูกแยกตามค่านี้
+        return self.active_version() or BASE_VERSION
+
+    def path_for(self, name: str, version: Optional[str] = None) -> str:
+        # version: ใช้เวอร์ชันที่ระบุแทนการอ่าน CURRENT (ให้ทุกโมเดลของคำขอเดียวมาจากเวอร์ชันเดียวกันแม้มี promote ระหว่างทาง)
+        version = version or self.serving_version()
+        if version == BASE_VERSION:
+            return os.path.join(self.model_dir, f"{name}.pkl")
+        return os.path.join(self.model_dir, VERSIONS_DIR, version, f"{name}.pkl")
+
+    def artifact_for(self, name: str, version: Optional[str] = None) -> str:
+        # backend flat ใช้ไฟล์ .flat (สร้างด้วย tree_eval.py export) ถ้ามีและไม่เก่ากว่าไฟล์ .pkl
+        path = self.path_for(name, version)
+        if self.backend != "flat":
+            return path
+        flat_path = flat_path_for(path)
+        try:
+            flat_mtime = os.stat(flat_path).st_mtime
+        except FileNotFoundError:
+            return path
+        try:
+            if os.stat(path).st_mtime > flat_mtime:
+                logger.warning("%s is older than %s, converting the pickle instead", flat_path, path)
+                return path
+        except FileNotFoundError:
+            pass
+        return flat_path
+
+    def get(self, name: str, version: Optional[str] = None) -> Any:
+        path = self.artifact_for(name, version)
+        stat = os.stat(path)  # FileNotFoundError ถ้าไม่มีไฟล์โมเดล
+
+        entry = self._models.get(name)
+        if entry is not None and self._is_fresh(entry, path, stat):
+            return entry.model
+
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None and self._is_fresh(entry, path, stat):
+                return entry.model
+            entry = self._load(name, path, stat, previous=entry)
+            self._models[name] = entry
+            return entry.model
+
+    def fingerprint(self, name: str) -> str:
+        # sha256 ของไฟล์โมเดลที่ใช้อยู่ ใช้เป็นส่วนหนึ่งของ key ของ cache ผลพยากรณ์
+        self.get(name)
+        return self._models[name].sha256
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> List[str]:
+        loaded = []
+        for name in names or HORIZON_MODELS:
+            try:
+                self.get(name)
+                loaded.append(name)
+            except FileNotFoundError:
+                logger.error("Model file does not exist: %s", self.path_for(name))
+        return loaded
+
+    def loaded_versions(self) -> List[dict]:
+        return [self._models[name].version() for name in sorted(self._models, key=_model_sort_key)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+    @staticmethod
+    def _is_fresh(entry: LoadedModel, path: str, stat: os.stat_result) -> bool:
+        return entry.path == path and entry.mtime == stat.st_mtime and entry.size == stat.st_size
+
+    def _load(self, name: str, path: str, stat: os.stat_result, previous: Optional[LoadedModel]) -> LoadedModel:
+        sha256 = _file_sha256(path)
+        if previous is not None and previous.path == path and previous.sha256 == sha256:
+            # ไฟล์ถูก touch แต่เนื้อหาเหมือนเดิม ไม่ต้อง unpickle ใหม่
+            model = previous.model
+            loaded_at = previous.loaded_at
+            backend = previous.backend
+        else:
+            model = None
+            if path.endswith(FLAT_SUFFIX):
+                # map ไฟล์เข้าหน่วยความจำโดยตรง ไม่ต้อง unpickle และหลาย worker ใช้หน้า memory ร่วมกันได้
+                try:
+                    model, backend = FlatTreeEnsemble.load(path), "flat"
+                except ValueError as error:
+                    logger.warning("%s, converting the pickle instead", error)
+            if model is None:
+                with open(os.path.splitext(path)[0] + ".pkl", "rb") as f:
+                    model = pickle.load(f)
+                backend = "sklearn"
+                if self.backend == "flat":
+                    model, backend = self._to_flat(name, model)
+            loaded_at = datetime.now()
+            logger.info("Loaded model %s from %s (sha256=%s, backend=%s)", name, path, sha256[:12], backend)
+        return LoadedModel(
+            name=name,
+            path=path,
+            model=model,
+            mtime=stat.st_mtime,
+            size=stat.st_size,
+            sha256=sha256,
+            loaded_at=loaded_at,
+            backend=backend,
+        )
+
+    @staticmethod
+    def _to_flat(name: str, model: Any):
+        # ตรวจผลเทียบกับ sklearn ก่อนใช้งาน ถ้าไม่ตรงให้ใช้ตัวเดิมต่อไป
+        try:
+            flat = FlatTreeEnsemble.from_sklearn(model)
+            check_parity(model, flat)
+        except Exception:
+            logger.exception("Flat evaluator unavailable for %s, falling back to sklearn", name)
+            return model, "sklearn"
+        return flat, "flat"
+
+
+def _model_sort_key(name: str):
+    return (0, int(name[1:])) if name[:1] == "T" and name[1:].isdigit() else (1, name)
+
+
+registry = ModelRegistry(backend=config.INFERENCE_BACKEND)
+
+
+# จัดการเวอร์ชันที่ training.py เขียนไว้ อยู่ที่นี่เพื่อให้ API แสดงและสลับเวอร์ชันได้โดยไม่ต้อง import sklearn
+def version_dir(version: str) -> str:
+    return os.path.join(MODEL_DIR, VERSIONS_DIR, version)
+
+
+def read_metadata(version: str) -> dict:
+    with open(os.path.join(version_dir(version), METADATA_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_versions() -> List[dict]:
+    root = os.path.join(MODEL_DIR, VERSIONS_DIR)
+    if not os.path.isdir(root):
+        return []
+    active = registry.active_version()
+    versions = []
+    for name in sorted(os.listdir(root), reverse=True):
+        if name.endswith(".tmp") or not os.path.isfile(os.path.join(root, name, METADATA_FILE)):
+            continue
+        metadata = read_metadata(name)
+        versions.append({
+            "version": name,
+            "active": name == active,
+            "created_at": metadata.get("created_at"),
+            "training_window": metadata.get("training_window"),
+            "sklearn_version": metadata.get("sklearn_version"),
+            "models": {model: info.get("validation") for model, info in metadata.get("models", {}).items()},
+        })
+    return versions
+
+
+def promote(version: Optional[str]) -> None:
+    """Point serving at ``version`` (None = back to the original models/T*.pkl) with one atomic rename.
+
+    Stored predictions are not purged: each predictiontable row records the
+    ``model_version`` that produced it and lookups (predict-or-fetch,
+    check-predictions, analytics) only read rows of the serving version, so
+    months forecast before the promote are recomputed with the new models on
+    the next request. Switching back finds the earlier rows again.
+    """
+    pointer = os.path.join(MODEL_DIR, CURRENT_POINTER)
+    if version is None:
+        if os.path.exists(pointer):
+            os.remove(pointer)
+        return
+    missing = [name for name in HORIZON_MODELS
+               if not os.path.isfile(os.path.join(version_dir(version), f"{name}.pkl"))]
+    if not os.path.isfile(os.path.join(version_dir(version), METADATA_FILE)) or missing:
+        raise FileNotFoundError(f"Model version {version} is incomplete or does not exist")
+    tmp = pointer + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp, pointer)
+    logger.info("Promoted model version %s", version)
+
@@ -0,0 +1,13 @@
+-- predictiontable.model_version: the model version that produced each stored prediction
+-- ('base' = the original models/T*.pkl, otherwise a folder name under models/versions).
+-- Run once against an existing efsdata database (MySQL / MariaDB) after indexes.sql.
+
+START TRANSACTION;
+
+-- แถวที่มีอยู่แล้วถูกพยากรณ์ด้วยโมเดลชุดเดิมทั้งหมด จึงได้ค่า 'base'
+ALTER TABLE `predictiontable`
+  ADD COLUMN `model_version` varchar(32) NOT NULL DEFAULT 'base' AFTER `year_predict`,
+  DROP INDEX `uq_prediction_natural_key`,
+  ADD UNIQUE KEY `uq_prediction_natural_key` (`building`, `modelName`, `year_current`, `month_current`, `model_version`);
+
+COMMIT;
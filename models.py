@@ -1,15 +1,25 @@
 from datetime import datetime  # ใช้ datetime จาก Python เองสำหรับเวลาปัจจุบัน
-from sqlalchemy import Column, ForeignKey, Integer, String, Float, Boolean, DateTime  # นำเข้า Boolean และ DateTime จาก SQLAlchemy
+from sqlalchemy import Column, ForeignKey, Integer, String, Float, Boolean, DateTime, Index, Text, UniqueConstraint  # นำเข้า Boolean และ DateTime จาก SQLAlchemy
 from sqlalchemy.ext.declarative import declarative_base
 
+from config import BASE_VERSION
+
 Base = declarative_base()
 
+class GroupBuilding(Base):
+    __tablename__ = 'groupbuilding'
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False)
+    about = Column(Text)
+
 class Building(Base):
     __tablename__ = 'building'
     id = Column(Integer, primary_key=True, index=True)
     code = Column(String, index=True)
     name = Column(String, index=True)
     area = Column(String, index=True)
+    # กลุ่มอาคาร (ตรงกับ fk_idGroup ใน Database.sql) ใช้สรุปผลพยากรณ์รายกลุ่ม
+    idGroup = Column(Integer, ForeignKey('groupbuilding.id'), index=True)
 
 class Unit(Base):
     __tablename__ = 'unit'
@@ -19,6 +29,11 @@ class Unit(Base):
     amount = Column(Integer)
     idBuilding = Column(Integer, ForeignKey('building.id'))
 
+    __table_args__ = (
+        # หนึ่งแถวต่ออาคารต่อเดือน ให้ bulk/import ใช้ upsert ของฐานข้อมูลได้ (ใช้เป็น index ค้นตามงวดด้วย)
+        UniqueConstraint('years', 'month', 'idBuilding', name='uq_unit_period_building'),
+    )
+
 class NumberOfUsers(Base):
     __tablename__ = 'numberOfUsers'
     id = Column(Integer, primary_key=True, index=True)
@@ -26,6 +41,10 @@ class NumberOfUsers(Base):
     month = Column(Integer)
     amount = Column(Integer)
 
+    __table_args__ = (
+        UniqueConstraint('years', 'month', name='uq_numberofusers_period'),
+    )
+
 class ExamStatus(Base):
     __tablename__ = 'examStatus'
     id = Column(Integer, primary_key=True, index=True)
@@ -33,6 +52,10 @@ class ExamStatus(Base):
     month = Column(Integer)
     status = Column(Boolean)
 
+    __table_args__ = (
+        UniqueConstraint('years', 'month', name='uq_examstatus_period'),
+    )
+
 class SemesterStatus(Base):
     __tablename__ = 'semesterStatus'
     id = Column(Integer, primary_key=True, index=True)
@@ -40,6 +63,10 @@ class SemesterStatus(Base):
     month = Column(Integer)
     status = Column(Boolean)
 
+    __table_args__ = (
+        UniqueConstraint('years', 'month', name='uq_semesterstatus_period'),
+    )
+
 class Member(Base):
     __tablename__ = 'member'
     id = Column(Integer, primary_key=True, index=True)
@@ -68,4 +95,67 @@ class PredictionTable(Base):
     year_current = Column(Integer)
     month_predict = Column(Integer)
     year_predict = Column(Integer)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # เวอร์ชันโมเดลที่สร้างผลนี้ (BASE_VERSION หรือชื่อโฟลเดอร์ใน models/versions) หลัง promote จะอ่านเฉพาะแถวของเวอร์ชันใหม่
+    model_version = Column(String(32), nullable=False, default=BASE_VERSION, server_default=BASE_VERSION)
+
+    # ทุกการอ่านกรองด้วย (year_current, month_current) และ get_latest_year_month เรียงตามสองคอลัมน์นี้
+    __table_args__ = (
+        UniqueConstraint('building', 'modelName', 'year_current', 'month_current', 'model_version',
+                         name='uq_prediction_natural_key'),
+        Index('ix_prediction_period', 'year_current', 'month_current', 'modelName'),
+    )
+
+
+class FeatureStore(Base):
+    __tablename__ = "featurestore"
+
+    # lag features 51 คอลัมน์ของอาคารหนึ่งในเดือนหนึ่ง คำนวณไว้ล่วงหน้า (ดู feature_store.py)
+    id = Column(Integer, primary_key=True, index=True)
+    idBuilding = Column(Integer)
+    years = Column(Integer)
+    month = Column(Integer)
+    idUnit = Column(Integer)
+    area = Column(String(255))  # คัดลอกมาจาก building.area (varchar(255) ใน Database.sql) จึงต้องยาวเท่ากัน
+    unit = Column(Integer)
+    features = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('idBuilding', 'years', 'month', name='uq_featurestore_key'),
+        Index('ix_featurestore_period', 'years', 'month', 'idUnit'),
+    )
+
+
+class BacktestRun(Base):
+    __tablename__ = "backtestrun"
+
+    id = Column(Integer, primary_key=True, index=True)
+    year_from = Column(Integer)
+    month_from = Column(Integer)
+    year_to = Column(Integer)
+    month_to = Column(Integer)
+    models = Column(String(255))
+    anchors = Column(Integer)
+    samples = Column(Integer)
+    duration = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class BacktestMetric(Base):
+    __tablename__ = "backtestmetric"
+
+    # scope: "horizon" (ต่อโมเดล), "building" (ต่ออาคาร รวมทุกโมเดล), "building_horizon" (ต่ออาคารต่อโมเดล)
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey('backtestrun.id'))
+    scope = Column(String(20))
+    modelName = Column(String(20))
+    building = Column(Integer)
+    n = Column(Integer)
+    mae = Column(Float)
+    mape = Column(Float)
+    rmse = Column(Float)
+
+    __table_args__ = (
+        Index('ix_backtestmetric_run_scope', 'run_id', 'scope'),
+    )
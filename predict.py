@@ -1,147 +1,144 @@
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Callable, List, Optional
+import numpy as np
 import pandas as pd
-import pickle
-from models import Building, ExamStatus, NumberOfUsers, SemesterStatus, Unit
+from model_registry import registry
+import forecast_pool
+from features import FEATURE_COLUMNS, feature_matrix, shift_month
+from feature_store import load_features
 from schemas import PredictionRequest, PredictionResponse
 import logging
 from fastapi import HTTPException
-import os
-from datetime import datetime
 from fastapi import Query
-
-
-
-# --------- ส่วนของการเก็บ log ---------------
-# สร้างโฟลเดอร์ 'log' หากยังไม่มี
-if not os.path.exists('log'):
-    os.makedirs('log')
-
-# สร้างชื่อไฟล์ที่มีวันที่และเวลาปัจจุบัน
-current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
-log_filename = f'log/log-{current_time}.txt'
-
-# กำหนดค่าให้กับ logging
-logging.basicConfig(filename=log_filename, level=logging.INFO, format='%(asctime)s - %(message)s')
-
-# --------- ส่วนของการเก็บ log ---------------
-
-def load_model(model_name: str):
-    model_path = f"models/{model_name}.pkl"
-    if not os.path.exists(model_path):
-        logging.error(f"Model file does not exist: {model_path}")
+import config
+import metrics
+
+# log ถูกตั้งค่าที่ logging_config.setup_logging() (เรียกจาก main.py และ CLI) ไม่สร้างไฟล์ใหม่ทุกครั้งที่ import
+logger = logging.getLogger(__name__)
+
+def load_model(model_name: str, model_version: Optional[str] = None):
+    # โมเดลถูกโหลดครั้งเดียวและเก็บไว้ใน registry (โหลดใหม่เมื่อไฟล์เปลี่ยน)
+    try:
+        with metrics.stage("model_load", model_name):
+            return registry.get(model_name, model_version)
+    except FileNotFoundError:
+        logger.error("Model file does not exist: %s", registry.path_for(model_name, model_version))
         raise HTTPException(status_code=404, detail="Model file not found")
-    with open(model_path, "rb") as f:
-        return pickle.load(f)
 
-def predict(request: PredictionRequest, db: Session) -> List[PredictionResponse]:
-    model_name = request.modelName
-    
+def predict_batch(model_names: List[str], X: np.ndarray, on_horizon: Optional[Callable[[str], None]] = None,
+                  model_version: Optional[str] = None) -> np.ndarray:
+    """Run each model once over the whole feature matrix; returns (models x buildings).
+
+    All models come from ``model_version`` (default: the serving version, read once).
+    """
+    model_version = model_version or registry.serving_version()
+    if forecast_pool.enabled():
+        for model_name in model_names:
+            load_model(model_name, model_version)  # ตรวจว่ามีไฟล์โมเดลก่อนส่งงานให้ process pool
+        try:
+            # งานของแต่ละ horizon กระจายอยู่ใน pool จึงจับเวลารวมเป็นก้อนเดียว
+            with metrics.stage("inference", "pool"):
+                return forecast_pool.predict_parallel(model_names, X, on_horizon, model_version)
+        except Exception as model_error:
+            logger.error("Model prediction error in process pool: %s", model_error)
+            raise HTTPException(status_code=500, detail="Model prediction error")
+
+    # ห่อเป็น DataFrame ครั้งเดียว (ไม่ copy) เพื่อให้ชื่อคอลัมน์ตรงกับตอน train
+    frame = pd.DataFrame(X, columns=FEATURE_COLUMNS, copy=False)
+    results = np.empty((len(model_names), len(X)), dtype=np.float64)
+    for i, model_name in enumerate(model_names):
+        model = load_model(model_name, model_version)
+        try:
+            with metrics.stage("inference", model_name):
+                results[i] = model.predict(frame)
+        except Exception as model_error:
+            logger.error("Model prediction error with model %s: %s", model_name, model_error)
+            raise HTTPException(status_code=500, detail="Model prediction error")
+        if on_horizon:
+            on_horizon(model_name)
+    return results
+
+def parse_model_names(model_name: str) -> List[str]:
     if not model_name:
-        logging.error("Model name is missing or empty")
+        logger.error("Model name is missing or empty")
         raise HTTPException(status_code=400, detail="Model name is required")
-    
-    model_names = []
+
     if model_name == "All":
-        model_names = [f"T{i}" for i in range(1, 13)]
-    else:
-        model_names = model_name.split(",")  # แก้ให้ถูกต้องตาม format "T1,T2,T3"
+        return [f"T{i}" for i in range(1, 13)]
+    return model_name.split(",")  # แก้ให้ถูกต้องตาม format "T1,T2,T3"
 
-    logging.info(f"Model names to be used: {model_names}")
+def model_horizon(model_name: str, default: int) -> int:
+    if model_name[:1] == "T" and model_name[1:].isdigit():
+        return int(model_name[1:])
+    return default
+
+def predict(request: PredictionRequest, db: Session, progress: Optional[Callable[[str, int, int], None]] = None,
+            model_version: Optional[str] = None) -> List[PredictionResponse]:
+    model_names = parse_model_names(request.modelName)
+
+    logger.info("Model names to be used: %s", model_names)
     
     year = request.year
     month = request.month
 
-    units = db.query(Unit.idBuilding).filter_by(years=year, month=month).distinct().all()
-    if not units:
-        logging.warning(f"No buildings found in Unit table for year: {year}, month: {month}")
+    # อ่าน lag features ที่คำนวณไว้แล้วจาก featurestore (ถ้ายังไม่มีจะดึงข้อมูลย้อนหลัง 12 เดือนมาจัดในหน่วยความจำ)
+    with metrics.stage("features"):
+        building_ids, feature_rows = load_features(db, year, month)
+    if not building_ids:
+        logger.warning("No buildings found in Unit table for year: %s, month: %s", year, month)
         raise HTTPException(status_code=404, detail="No buildings found for the specified year and month")
 
-    building_ids = [unit.idBuilding for unit in units]
-    
+    found = {row.building_id for row in feature_rows}
+    for building_id in building_ids:
+        if building_id not in found:
+            logger.warning("Building not found for id: %s", building_id)
+
     predictions = []
+    if not feature_rows:
+        return predictions
 
-    for building_id in building_ids:
-        building = db.query(Building).filter_by(id=building_id).first()
-        if not building:
-            logging.warning(f"Building not found for id: {building_id}")
-            continue
-
-        building_code = building.code
-        building_area = building.area
-
-        current_unit = db.query(Unit).filter_by(years=year, month=month, idBuilding=building_id).first()
-        unit_amount = current_unit.amount if current_unit else 0
-
-        data = {
-            "month": month,
-            "building": str(building_id),
-            "Area": building_area,
-            "Unit": unit_amount
-        }
-
-        current_number_of_users = db.query(NumberOfUsers).filter_by(years=year, month=month).first()
-        current_exam_status = db.query(ExamStatus).filter_by(years=year, month=month).first()
-        current_semester_status = db.query(SemesterStatus).filter_by(years=year, month=month).first()
-
-        data["Eusers"] = current_number_of_users.amount if current_number_of_users else 0
-        data["exam"] = current_exam_status.status if current_exam_status else 0
-        data["semester"] = current_semester_status.status if current_semester_status else 0
-
-        for i in range(1, 12):
-            prev_month = (month - i - 1) % 12 + 1
-            prev_year = year - (1 if month - i <= 0 else 0)
-            
-            number_of_users = db.query(NumberOfUsers).filter_by(years=prev_year, month=prev_month).first()
-            exam_status = db.query(ExamStatus).filter_by(years=prev_year, month=prev_month).first()
-            semester_status = db.query(SemesterStatus).filter_by(years=prev_year, month=prev_month).first()
-            unit = db.query(Unit).filter_by(years=prev_year, month=prev_month, idBuilding=building_id).first()
-
-            data[f"Eusers-{i}"] = number_of_users.amount if number_of_users else 0
-            data[f"exam-{i}"] = exam_status.status if exam_status else 0
-            data[f"semester-{i}"] = semester_status.status if semester_status else 0
-            data[f"Unit-{i}"] = unit.amount if unit else 0
-
-        columns = ['month', 'building', 'Area', 'Eusers'] + \
-                  [f'Eusers-{i}' for i in range(1, 12)] + \
-                  ['exam'] + \
-                  [f'exam-{i}' for i in range(1, 12)] + \
-                  ['semester'] + \
-                  [f'semester-{i}' for i in range(1, 12)] + \
-                  ['Unit'] + \
-                  [f'Unit-{i}' for i in range(1, 12)]
-        df = pd.DataFrame([data])
-        X = df[columns]
-
-        logging.info(f"Building: {building_id}, Data: {data}")
-        logging.info(f"DataFrame columns: {X.columns.tolist()}")
-        logging.info(f"DataFrame data: {X.values.tolist()}")
+    X = feature_matrix(feature_rows)
+    # feature ทั้ง 51 ค่าของทุกอาคารเขียนเฉพาะเมื่อเปิด LOG_FEATURES และระดับ DEBUG
+    if config.LOG_FEATURES and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("DataFrame columns: %s", FEATURE_COLUMNS)
+        for row in feature_rows:
+            logger.debug("Building: %s, Data: %s", row.building_id, row.data,
+                         extra={"building": row.building_id, "year": year, "month": month, "features": row.data})
+
+    done = []
+
+    def on_horizon(model_name: str):
+        done.append(model_name)
+        if progress:
+            progress(model_name, len(done) * len(feature_rows), len(model_names) * len(feature_rows))
 
+    results = predict_batch(model_names, X, on_horizon, model_version)
+
+    # เรียงผลลัพธ์ตามอาคารแล้วตามโมเดล เหมือนเดิม
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for j, row in enumerate(feature_rows):
         for i, model_name in enumerate(model_names):
-            try:
-                model = load_model(model_name)
-                prediction = model.predict(X)[0]
-
-                # คำนวณ month_predict และ year_predict
-                month_predict = (month + i) % 12 + 1
-                year_predict = year + (month + i - 1) // 12
-
-                predictions.append({
-                    "building": str(building_id),
-                    "area": building_area,
-                    "prediction": prediction,
-                    "unit": unit_amount,
-                    "modelName": model_name,
-                    "month_current": month,
-                    "year_current": year,
-                    "month_predict": month_predict,
-                    "year_predict": year_predict
-                })
-                
-                logging.info(f"Model: {model_name}, Building: {building_id}, Prediction: {prediction}, Month Predict: {month_predict}, Year Predict: {year_predict}")
-            except Exception as model_error:
-                logging.error(f"Model prediction error for building {building_id} with model {model_name}: {str(model_error)}")
-                raise HTTPException(status_code=500, detail="Model prediction error")
-    
+            prediction = float(results[i, j])
+
+            # คำนวณ month_predict และ year_predict จาก horizon ของโมเดล (T3 = อีก 3 เดือนข้างหน้า)
+            year_predict, month_predict = shift_month(year, month, model_horizon(model_name, i + 1))
+
+            predictions.append({
+                "building": str(row.building_id),
+                "area": row.area,
+                "prediction": prediction,
+                "unit": row.unit,
+                "modelName": model_name,
+                "month_current": month,
+                "year_current": year,
+                "month_predict": month_predict,
+                "year_predict": year_predict
+            })
+
+            if debug:
+                logger.debug("Model: %s, Building: %s, Prediction: %s, Month Predict: %s, Year Predict: %s",
+                             model_name, row.building_id, prediction, month_predict, year_predict)
+
+    logger.info("Predicted %d buildings x %d models for %d-%02d", len(feature_rows), len(model_names), year, month)
     return predictions
 
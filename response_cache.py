@@ -0,0 +1,208 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import config
+import metrics
+
+# ตารางที่ถูกเขียนใน transaction ที่ยังไม่ commit เก็บไว้ใน connection.info
+_PENDING_KEY = "efs_written_tables"
+_committing = threading.local()
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    last_modified: int
+    expires_at: float
+
+
+class ResponseCache:
+    """LRU of serialized JSON responses with a TTL, invalidated by table name.
+
+    Each entry remembers the tables it was read from; a commit that wrote
+    any of them drops the entry. The TTL bounds staleness for writes made
+    outside this process (CLI importer, another worker).
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, Tuple[CachedResponse, Tuple[str, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # เวลาและรุ่นที่แต่ละตารางถูกแก้ครั้งล่าสุด (รุ่นใช้กันไม่ให้ผลที่อ่านก่อนการแก้ถูกเก็บลง cache)
+        self._changed_at: Dict[str, float] = {}
+        self._generation: Dict[str, int] = {}
+        self._started_at = time.time()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key: tuple) -> Optional[CachedResponse]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0].expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[0]
+
+    def generations(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generation.get(table, 0) for table in tables)
+
+    def put(self, key: tuple, tables: Tuple[str, ...], payload: Any, generations: Tuple[int, ...]) -> CachedResponse:
+        body = serialize(payload)
+        with self._lock:
+            last_modified = max([self._changed_at.get(table, self._started_at) for table in tables] or [self._started_at])
+            entry = CachedResponse(
+                body=body,
+                etag=_etag(body),
+                last_modified=int(last_modified),
+                expires_at=time.monotonic() + self.ttl,
+            )
+            if generations == tuple(self._generation.get(table, 0) for table in tables):
+                self._entries[key] = (entry, tables)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, tables: Iterable[str]) -> None:
+        tables = set(tables)
+        if not tables:
+            return
+        now = time.time()
+        with self._lock:
+            for table in tables:
+                self._changed_at[table] = now
+                self._generation[table] = self._generation.get(table, 0) + 1
+            for key in [key for key, (_, used) in self._entries.items() if tables.intersection(used)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+cache = ResponseCache(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_TTL)
+
+
+def serialize(payload: Any) -> bytes:
+    # bytes คือ JSON ที่ serialize มาแล้ว (เช่นจาก fast_json) ใช้ตามนั้นได้เลย
+    if isinstance(payload, bytes):
+        return payload
+    # รูปแบบเดียวกับ JSONResponse ของ FastAPI
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _not_modified(request: Request, entry: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == entry.etag for tag in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return entry.last_modified <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _response(request: Request, entry: CachedResponse) -> Response:
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": formatdate(entry.last_modified, usegmt=True),
+        # ให้ browser ถามกลับทุกครั้ง (ได้ 304 ถ้าข้อมูลไม่เปลี่ยน)
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(request, entry):
+        metrics.RESPONSE_CACHE.inc(result="not_modified")
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def _lookup(key: tuple) -> Optional[CachedResponse]:
+    entry = cache.get(key) if cache.enabled else None
+    metrics.RESPONSE_CACHE.inc(result="hit" if entry is not None else "miss")
+    return entry
+
+
+def _store(key: tuple, tables: Tuple[str, ...], payload: Any, generations: Tuple[int, ...]) -> CachedResponse:
+    if cache.enabled:
+        return cache.put(key, tables, payload, generations)
+    body = serialize(payload)
+    return CachedResponse(body, _etag(body), int(time.time()), 0.0)
+
+
+def respond(request: Request, key: tuple, tables: Tuple[str, ...], load: Callable[[], Any]) -> Response:
+    """Serve ``load()`` as JSON from the cache; ``tables`` are the tables it reads."""
+    entry = _lookup(key)
+    if entry is None:
+        generations = cache.generations(tables)
+        entry = _store(key, tables, load(), generations)
+    return _response(request, entry)
+
+
+async def respond_async(request: Request, key: tuple, tables: Tuple[str, ...],
+                        load: Callable[[], Awaitable[Any]]) -> Response:
+    entry = _lookup(key)
+    if entry is None:
+        generations = cache.generations(tables)
+        entry = _store(key, tables, await load(), generations)
+    return _response(request, entry)
+
+
+# ล้าง cache ตามตารางที่ถูก INSERT/UPDATE/DELETE เมื่อ transaction commit แล้วเท่านั้น
+# (ครอบคลุมทั้ง CRUD, bulk, importer และ engine แบบ async เพราะ event อยู่ที่ Engine)
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_write(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not (context.isinsert or context.isupdate or context.isdelete):
+        return
+    table = getattr(getattr(context.compiled, "statement", None), "table", None)
+    name = getattr(table, "name", None)
+    if name:
+        conn.info.setdefault(_PENDING_KEY, set()).add(name)
+
+
+@event.listens_for(Engine, "commit")
+def _invalidate_on_commit(conn):
+    tables = conn.info.pop(_PENDING_KEY, None)
+    if tables:
+        cache.invalidate(tables)
+        _committing.__dict__.setdefault("tables", set()).update(tables)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    # event "commit" ของ connection เกิดก่อน COMMIT จริง ล้างซ้ำอีกครั้งหลัง commit
+    # เพื่อไม่ให้ request ที่อ่านข้อมูลเก่าระหว่างนั้นเก็บผลลง cache ได้
+    tables = _committing.__dict__.pop("tables", None)
+    if tables:
+        cache.invalidate(tables)
+
+
+@event.listens_for(Engine, "rollback")
+def _discard_on_rollback(conn):
+    conn.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,181 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+import config
+import metrics
+from features import LAG_MONTHS, FeatureHistory, YearMonth, feature_matrix, shift_month
+from model_registry import registry
+from predict import load_model, predict_batch
+from schemas import RollingForecastRequest, RollingScenario
+
+logger = logging.getLogger(__name__)
+
+# พยากรณ์ทีละเดือนด้วยโมเดล 1 เดือนข้างหน้า แล้วใช้ผลเป็น Unit ของเดือนถัดไป
+ROLLING_MODEL = "T1"
+MAX_MONTHS = 60
+
+MemoKey = Tuple[str, bytes]
+
+
+class PredictionMemo:
+    """LRU of single-building predictions keyed by (model sha256, feature vector bytes).
+
+    Scenarios that share a prefix (same inputs up to some month) produce
+    identical feature vectors for those months, so only the months after the
+    scenarios diverge are sent to the model.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[MemoKey, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[MemoKey]) -> List[Optional[float]]:
+        values = []
+        with self._lock:
+            for key in keys:
+                value = self._items.get(key)
+                if value is not None:
+                    self._items.move_to_end(key)
+                values.append(value)
+        return values
+
+    def put_many(self, keys: List[MemoKey], values) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._items[key] = float(value)
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+memo = PredictionMemo(config.ROLLING_CACHE_SIZE)
+
+
+def _parse_period(key: str) -> YearMonth:
+    try:
+        year, month = (int(part) for part in key.split("-"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid month key: {key} (expected YYYY-MM)")
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail=f"Invalid month key: {key} (expected YYYY-MM)")
+    return year, month
+
+
+def _overrides(values: Dict[str, object]) -> Dict[YearMonth, object]:
+    return {_parse_period(key): value for key, value in values.items()}
+
+
+def _future_inputs(actual: Dict[YearMonth, object], anchor: YearMonth, months: int) -> Dict[YearMonth, object]:
+    # เดือนในอนาคต: ใช้ค่าในฐานข้อมูลถ้ามี ไม่งั้นใช้ค่าเดือนเดียวกันของปีก่อน
+    values = dict(actual)
+    for step in range(1, months + 1):
+        period = shift_month(*anchor, step)
+        if period in actual:
+            continue
+        last_year = shift_month(*period, -12)
+        if last_year in values:
+            values[period] = values[last_year]
+    return values
+
+
+def _scenario_history(base: FeatureHistory, anchor: YearMonth, months: int,
+                      scenario: RollingScenario) -> FeatureHistory:
+    units = {key: value for key, value in base.units.items() if (key[0], key[1]) <= anchor}
+    users = _future_inputs(base.users, anchor, months)
+    exams = _future_inputs(base.exams, anchor, months)
+    semesters = _future_inputs(base.semesters, anchor, months)
+
+    if scenario.users_factor != 1.0:
+        for step in range(1, months + 1):
+            period = shift_month(*anchor, step)
+            if users.get(period) is not None:
+                users[period] = users[period] * scenario.users_factor
+    users.update(_overrides(scenario.users))
+    exams.update(_overrides(scenario.exam))
+    semesters.update(_overrides(scenario.semester))
+    return FeatureHistory(base.buildings, units, users, exams, semesters, base.unit_buildings, base.unit_ids)
+
+
+def _run_scenario(history: FeatureHistory, buildings: List[int], anchor: YearMonth, months: int,
+                  fingerprint: str, counts: Dict[str, int]) -> List[dict]:
+    trajectory = []
+    for step in range(months):
+        year, month = shift_month(*anchor, step)
+        rows = [history.feature_row(building_id, year, month) for building_id in buildings]
+        X = feature_matrix(rows)
+        keys = [(fingerprint, x.tobytes()) for x in X]
+        values = memo.get_many(keys)
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            predicted = predict_batch([ROLLING_MODEL], X[missing])[0]
+            memo.put_many([keys[i] for i in missing], predicted)
+            for i, value in zip(missing, predicted):
+                values[i] = float(value)
+        counts["hits"] += len(keys) - len(missing)
+        counts["misses"] += len(missing)
+
+        year_predict, month_predict = shift_month(year, month, 1)
+        for building_id, value in zip(buildings, values):
+            history.units[(year_predict, month_predict, building_id)] = value
+        trajectory.append({
+            "year": year_predict,
+            "month": month_predict,
+            "total": float(np.sum(values)),
+            "buildings": [
+                # building.area เก็บเป็นข้อความ แปลงเป็นตัวเลขเหมือน PredictionResponse.area ของ /predict
+                {"building": str(row.building_id), "area": float(row.area), "prediction": value}
+                for row, value in zip(rows, values)
+            ],
+        })
+    return trajectory
+
+
+def rolling_forecast(request: RollingForecastRequest, db: Session) -> dict:
+    """Project monthly units ``months`` ahead per scenario by feeding T1 predictions back as lags."""
+    if not 1 <= request.months <= MAX_MONTHS:
+        raise HTTPException(status_code=400, detail=f"months must be between 1 and {MAX_MONTHS}")
+    if not request.scenarios:
+        raise HTTPException(status_code=400, detail="At least one scenario is required")
+
+    anchor = (request.year, request.month)
+    load_model(ROLLING_MODEL)
+    fingerprint = registry.fingerprint(ROLLING_MODEL)
+
+    base = FeatureHistory.load(db, shift_month(*anchor, -LAG_MONTHS), shift_month(*anchor, request.months))
+    buildings = [b for b in base.buildings_with_unit(*anchor) if b in base.buildings]
+    if not buildings:
+        raise HTTPException(status_code=404, detail="No buildings found for the specified year and month")
+
+    counts = {"hits": 0, "misses": 0}
+    scenarios = []
+    for scenario in request.scenarios:
+        history = _scenario_history(base, anchor, request.months, scenario)
+        scenarios.append({
+            "name": scenario.name,
+            "trajectory": _run_scenario(history, buildings, anchor, request.months, fingerprint, counts),
+        })
+    metrics.ROLLING_MEMO.inc(counts["hits"], result="hit")
+    metrics.ROLLING_MEMO.inc(counts["misses"], result="miss")
+    logger.info("Rolling forecast %d-%02d x%d months, %d scenarios (cache hits %d, misses %d)",
+                request.year, request.month, request.months, len(scenarios), counts["hits"], counts["misses"])
+    return {
+        "year": request.year,
+        "month": request.month,
+        "model": ROLLING_MODEL,
+        "months": request.months,
+        "scenarios": scenarios,
+        "cache": counts,
+    }
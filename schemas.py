@@ -1,9 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Annotated, Dict, List, Optional, Union
 
 class BuildingCreate(BaseModel):
     code: str
     name: str
     area: str
+    idGroup: Optional[int] = None
 
 class UnitCreate(BaseModel):
     years: int
@@ -60,3 +62,44 @@ class LoginResponse(BaseModel):
     username: str
     status: int
     name: str
+
+class BulkRowError(BaseModel):
+    index: int
+    detail: str
+
+class BulkResult(BaseModel):
+    inserted: int
+    updated: int
+    errors: List[BulkRowError]
+
+# body ของ bulk endpoint: แถวที่ตรง schema ถูกแปลงเป็น model ทันที แถวที่ไม่ตรงเก็บเป็น dict
+# ให้ ingest.validate_rows รายงานเป็นข้อผิดพลาดรายแถวแทนการตอบ 422 ทั้งชุด (OpenAPI แสดง schema ของแถวด้วย)
+def _bulk_items(schema: type):
+    return List[Annotated[Union[schema, dict], Field(union_mode="left_to_right")]]
+
+UnitBulk = _bulk_items(UnitCreate)
+NumberOfUsersBulk = _bulk_items(NumberOfUsersCreate)
+ExamStatusBulk = _bulk_items(ExamStatusCreate)
+SemesterStatusBulk = _bulk_items(SemesterStatusCreate)
+
+class RollingScenario(BaseModel):
+    name: str = "base"
+    # ค่าที่กำหนดเองรายเดือน key เป็น "YYYY-MM"
+    users: Dict[str, int] = {}
+    exam: Dict[str, bool] = {}
+    semester: Dict[str, bool] = {}
+    # ตัวคูณจำนวนผู้ใช้ของเดือนในอนาคตที่ไม่ได้กำหนดค่าไว้
+    users_factor: float = 1.0
+
+class RollingForecastRequest(BaseModel):
+    year: int
+    month: int
+    months: int = 24
+    scenarios: List[RollingScenario] = [RollingScenario()]
+
+class BacktestRequest(BaseModel):
+    year_from: int
+    month_from: int
+    year_to: int
+    month_to: int
+    modelName: str = "All"
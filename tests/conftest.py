@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+import pytest
+
+# ตั้งค่าก่อน import config/database: ใช้ SQLite ชั่วคราวแทน efsdata (MySQL) และรันโมเดลใน process เดียว
+_TMP_DIR = tempfile.mkdtemp(prefix="efs-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'efs.db')}"
+os.environ["DB_MODE"] = "sync"
+os.environ["LOG_DIR"] = os.path.join(_TMP_DIR, "log")
+os.environ["PREDICT_WORKERS"] = "0"
+os.environ["FEATURE_STORE"] = "1"
+
+# ข้อมูลตั้งต้น: 3 อาคาร ข้อมูลครบ 13 เดือน (2023-01 ถึง 2024-01) พอสำหรับ lag 12 เดือนของ 2024-01
+BUILDINGS = {1: "1200.5", 2: "830", 3: "4407.75"}
+SEED_MONTHS = [(2023, month) for month in range(1, 13)] + [(2024, 1)]
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+    from database import engine
+    from models import Base
+
+    # ตารางจริงสร้างจาก Database.sql จึงสร้างตารางของ models.py ให้ฐานข้อมูลทดสอบเอง
+    Base.metadata.create_all(bind=engine)
+    # startup/shutdown ของ app ปิด executor และ log writer จึงเปิด TestClient ครั้งเดียวทั้ง session
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db(client):
+    from database import SessionLocal
+    from models import Base
+    import response_cache
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
+        response_cache.cache.clear()
+
+
+@pytest.fixture
+def seeded(db):
+    from models import Building, ExamStatus, NumberOfUsers, SemesterStatus, Unit
+
+    for building_id, area in BUILDINGS.items():
+        db.add(Building(id=building_id, code=f"B{building_id}", name=f"Building {building_id}", area=area))
+    for i, (year, month) in enumerate(SEED_MONTHS):
+        db.add(NumberOfUsers(years=year, month=month, amount=20000 + 100 * i))
+        db.add(ExamStatus(years=year, month=month, status=month in (3, 5, 10, 12)))
+        db.add(SemesterStatus(years=year, month=month, status=month not in (4, 6, 7)))
+        for building_id in BUILDINGS:
+            db.add(Unit(years=year, month=month, idBuilding=building_id, amount=1000 * building_id + 10 * i))
+    db.commit()
+    return db
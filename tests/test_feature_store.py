@@ -0,0 +1,74 @@
+import pytest
+
+import feature_store
+from features import assemble_features
+from ingest import ingest
+from models import FeatureStore, Unit
+
+from conftest import SEED_MONTHS
+
+
+def _stored(db, year, month):
+    stored = feature_store.read_anchor(db, year, month)
+    if stored is None:
+        return [], []
+    return stored
+
+
+def _assert_store_matches(db, months=SEED_MONTHS):
+    db.expire_all()
+    for year, month in months:
+        stored_ids, stored_rows = _stored(db, year, month)
+        ids, rows = assemble_features(db, year, month)
+        assert stored_ids == ids, (year, month)
+        assert [(r.building_id, r.area, r.unit, r.data) for r in stored_rows] == \
+               [(r.building_id, r.area, r.unit, r.data) for r in rows], (year, month)
+
+
+@pytest.fixture
+def store(seeded):
+    feature_store.rebuild(seeded)
+    seeded.commit()
+    return seeded
+
+
+def test_rebuild_matches_assembled_features(store):
+    assert store.query(FeatureStore).count() == 3 * len(SEED_MONTHS)
+    _assert_store_matches(store)
+
+
+def test_unit_crud_refreshes_store(client, store):
+    response = client.post("/units/", json={"years": 2024, "month": 2, "amount": 999, "idBuilding": 2})
+    assert response.status_code == 200
+    _assert_store_matches(store, SEED_MONTHS + [(2024, 2)])
+
+    unit_id = store.query(Unit.id).filter(Unit.years == 2023, Unit.month == 6, Unit.idBuilding == 1).scalar()
+    assert client.put(f"/units/{unit_id}", json={"years": 2023, "month": 6, "amount": 5, "idBuilding": 1}).status_code == 200
+    _assert_store_matches(store, SEED_MONTHS + [(2024, 2)])
+
+    # ย้ายแถวไปเดือนอื่น: ทั้งเดือนเดิมและเดือนใหม่ต้องถูกคำนวณใหม่
+    assert client.put(f"/units/{unit_id}", json={"years": 2024, "month": 2, "amount": 5, "idBuilding": 1}).status_code == 200
+    _assert_store_matches(store, SEED_MONTHS + [(2024, 2)])
+
+    assert client.delete(f"/units/{unit_id}").status_code == 200
+    _assert_store_matches(store, SEED_MONTHS + [(2024, 2)])
+
+
+def test_campus_wide_crud_refreshes_every_building(client, store):
+    assert client.post("/numberOfUsers/", json={"years": 2024, "month": 2, "amount": 1}).status_code == 200
+    assert client.post("/examStatus/", json={"years": 2024, "month": 2, "status": True}).status_code == 200
+    assert client.post("/units/", json={"years": 2024, "month": 2, "amount": 7, "idBuilding": 3}).status_code == 200
+    _assert_store_matches(store, SEED_MONTHS + [(2024, 2)])
+
+
+def test_building_area_change_refreshes_store(client, store):
+    response = client.put("/buildings/2", json={"code": "B2", "name": "Building 2", "area": "900.25"})
+    assert response.status_code == 200
+    _assert_store_matches(store)
+    assert {row.area for row in _stored(store, 2023, 6)[1] if row.building_id == 2} == {"900.25"}
+
+
+def test_bulk_ingest_refreshes_store(store):
+    ingest(store, "units", [{"years": 2023, "month": m, "amount": 1, "idBuilding": 3} for m in (3, 4)])
+    ingest(store, "semesterStatus", [{"years": 2023, "month": 9, "status": False}])
+    _assert_store_matches(store)
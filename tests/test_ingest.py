@@ -0,0 +1,102 @@
+import io
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from importer import import_rows, iter_file_rows
+from ingest import ingest
+from models import NumberOfUsers, Unit
+
+
+def _units(db):
+    return sorted((u.years, u.month, u.idBuilding, u.amount) for u in db.query(Unit).filter(Unit.years == 2025))
+
+
+def test_bulk_ingest_is_idempotent(seeded):
+    items = [{"years": 2025, "month": m, "amount": 100 + m, "idBuilding": b} for m in (1, 2) for b in (1, 2)]
+
+    first = ingest(seeded, "units", items)
+    assert (first.inserted, first.updated, first.errors) == (4, 0, [])
+    second = ingest(seeded, "units", items)
+    assert (second.inserted, second.updated, second.errors) == (0, 4, [])
+    assert _units(seeded) == sorted((i["years"], i["month"], i["idBuilding"], i["amount"]) for i in items)
+
+
+def test_bulk_ingest_updates_on_natural_key(seeded):
+    ingest(seeded, "numberOfUsers", [{"years": 2025, "month": 1, "amount": 10}])
+    result = ingest(seeded, "numberOfUsers", [{"years": 2025, "month": 1, "amount": 25}])
+
+    assert (result.inserted, result.updated) == (0, 1)
+    assert [r.amount for r in seeded.query(NumberOfUsers).filter(NumberOfUsers.years == 2025)] == [25]
+
+
+def test_bulk_ingest_reports_errors_per_row(seeded):
+    items = [
+        {"years": 2025, "month": 1, "amount": 1, "idBuilding": 1},
+        {"years": 2025, "month": 13, "amount": 1, "idBuilding": 1},
+        {"years": 2025, "month": 1, "amount": 2, "idBuilding": 1},
+        {"years": 2025, "month": 2, "amount": "many", "idBuilding": 1},
+        {"years": 2025, "month": 2, "amount": 1, "idBuilding": 999},
+        {"years": 2025, "month": 3, "amount": 3, "idBuilding": 2},
+    ]
+
+    result = ingest(seeded, "units", items)
+
+    assert [e["index"] for e in result.errors] == [1, 2, 3, 4]
+    assert "month" in result.errors[0]["detail"]
+    assert "duplicate of row 0" in result.errors[1]["detail"]
+    assert "amount" in result.errors[2]["detail"]
+    assert "building 999 not found" in result.errors[3]["detail"]
+    assert result.inserted == 2
+    assert _units(seeded) == [(2025, 1, 1, 1), (2025, 3, 2, 3)]
+
+
+def test_all_or_nothing_writes_nothing_on_error(seeded):
+    items = [{"years": 2025, "month": 1, "amount": 1, "idBuilding": 1},
+             {"years": 2025, "month": 0, "amount": 1, "idBuilding": 1}]
+
+    result = ingest(seeded, "units", items, all_or_nothing=True)
+
+    assert result.inserted == 0 and len(result.errors) == 1
+    assert _units(seeded) == []
+
+
+def test_unit_period_is_unique(seeded):
+    seeded.add(Unit(years=2023, month=1, idBuilding=1, amount=5))
+    with pytest.raises(IntegrityError):
+        seeded.commit()
+    seeded.rollback()
+
+
+def test_bulk_endpoint_returns_row_errors(client, seeded):
+    items = [{"years": 2025, "month": 1, "amount": 7, "idBuilding": 1},
+             {"years": 2025, "month": 2, "amount": "x", "idBuilding": 1},
+             {"years": 2025}]
+
+    response = client.post("/units/bulk", json=items)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["inserted"], body["updated"]) == (1, 0)
+    assert [e["index"] for e in body["errors"]] == [1, 2]
+    assert client.post("/units/bulk", json=items[:1]).json()["updated"] == 1
+
+
+def test_create_duplicate_period_conflicts(client, seeded):
+    response = client.post("/units/", json={"years": 2023, "month": 1, "amount": 5, "idBuilding": 1})
+    assert response.status_code == 409
+
+
+def test_import_same_file_twice(seeded):
+    data = "years,month,amount,idBuilding\n" + "".join(f"2025,{m},{m * 10},{b}\n" for m in range(1, 13) for b in (1, 2, 3))
+    data += "2025,13,1,1\n"
+
+    def run():
+        return import_rows(seeded, "units", iter_file_rows(io.BytesIO(data.encode()), "units.csv"), chunk_size=10)
+
+    first = run()
+    assert (first.rows, first.inserted, first.updated, first.error_count) == (37, 36, 0, 1)
+    assert first.errors[0]["index"] == 36
+    second = run()
+    assert (second.inserted, second.updated) == (0, 36)
+    assert len(_units(seeded)) == 36
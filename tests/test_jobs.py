@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from database import SessionLocal
+from jobs import DONE, ForecastJobQueue
+from model_registry import registry
+from schemas import PredictionRequest
+
+
+@pytest.fixture
+def gated_queue(seeded):
+    # worker เปิด session ได้หลัง release.set() เท่านั้น งานที่ส่งก่อนหน้านั้นจึงยังค้างอยู่ในคิวแน่นอน
+    release = threading.Event()
+
+    def session_factory():
+        release.wait(timeout=30)
+        return SessionLocal()
+
+    queue = ForecastJobQueue(session_factory, workers=1)
+    yield queue, release
+    release.set()
+    queue.shutdown()
+
+
+def _request(month=1, models="T1,T2"):
+    return PredictionRequest(year=2024, month=month, modelName=models)
+
+
+def test_same_request_is_coalesced(gated_queue):
+    queue, release = gated_queue
+    first = queue.submit(_request())
+    again = queue.submit(_request())
+    other_models = queue.submit(_request(models="T1"))
+    other_month = queue.submit(_request(month=2))
+
+    assert again is first
+    assert len({first.id, other_models.id, other_month.id}) == 3
+    assert first.key[3] == registry.serving_version()
+
+    release.set()
+    assert first.finished.wait(timeout=60)
+    assert first.status == DONE, first.error
+    assert len(first.result) == 3 * 2
+    assert {row["modelName"] for row in first.result} == {"T1", "T2"}
+
+
+def test_finished_job_is_not_reused(gated_queue):
+    queue, release = gated_queue
+    release.set()
+    first = queue.submit(_request())
+    assert first.finished.wait(timeout=60)
+
+    second = queue.submit(_request())
+
+    assert second is not first
+    assert second.finished.wait(timeout=60)
+    assert second.status == DONE and second.result == first.result
@@ -0,0 +1,65 @@
+from email.utils import formatdate
+
+from ingest import ingest
+from models import Unit
+
+
+def _unit_id(db, year=2023, month=1, building=1):
+    return db.query(Unit.id).filter(Unit.years == year, Unit.month == month, Unit.idBuilding == building).scalar()
+
+
+def test_etag_revalidation_returns_304(client, seeded):
+    unit_id = _unit_id(seeded)
+    first = client.get(f"/units/{unit_id}")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = client.get(f"/units/{unit_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    assert client.get(f"/units/{unit_id}", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_if_modified_since_returns_304(client, seeded):
+    unit_id = _unit_id(seeded)
+    last_modified = client.get(f"/units/{unit_id}").headers["last-modified"]
+
+    assert client.get(f"/units/{unit_id}", headers={"If-Modified-Since": last_modified}).status_code == 304
+    earlier = formatdate(0, usegmt=True)
+    assert client.get(f"/units/{unit_id}", headers={"If-Modified-Since": earlier}).status_code == 200
+
+
+def test_commit_invalidates_cached_response(client, seeded):
+    unit_id = _unit_id(seeded)
+    etag = client.get(f"/units/{unit_id}").headers["etag"]
+
+    assert client.put(f"/units/{unit_id}", json={"years": 2023, "month": 1, "amount": 4321, "idBuilding": 1}).status_code == 200
+
+    response = client.get(f"/units/{unit_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["amount"] == 4321
+    assert response.headers["etag"] != etag
+
+
+def test_list_invalidated_by_bulk_ingest(client, seeded):
+    params = {"year_from": 2025, "month_from": 1, "year_to": 2025, "month_to": 12}
+    before = client.get("/units/", params=params)
+    assert before.status_code == 200
+
+    ingest(seeded, "units", [{"years": 2025, "month": 1, "amount": 77, "idBuilding": 2}])
+
+    after = client.get("/units/", params=params, headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200
+    assert [row["amount"] for row in after.json()["items"]] == [77]
+
+
+def test_rollback_keeps_cached_response(client, seeded):
+    unit_id = _unit_id(seeded)
+    etag = client.get(f"/units/{unit_id}").headers["etag"]
+
+    seeded.query(Unit).filter(Unit.id == unit_id).update({"amount": 1})
+    seeded.flush()
+    seeded.rollback()
+
+    assert client.get(f"/units/{unit_id}", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,21 @@
+import os
+import pickle
+
+import pytest
+
+from model_registry import HORIZON_MODELS
+from training import HORIZON_PARAMS, model_params
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+
+
+@pytest.mark.parametrize("name", HORIZON_MODELS)
+def test_params_match_shipped_models(name):
+    with open(os.path.join(MODEL_DIR, f"{name}.pkl"), "rb") as f:
+        shipped = pickle.load(f).get_params()
+    params = model_params(name)
+    assert {key: shipped[key] for key in params} == params
+
+
+def test_every_horizon_has_params():
+    assert sorted(HORIZON_PARAMS) == sorted(HORIZON_MODELS)
@@ -0,0 +1,41 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from model_registry import HORIZON_MODELS
+from tree_eval import PREDICT_CHUNK_ROWS, FlatTreeEnsemble, probe_inputs
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+
+
+@pytest.fixture(scope="module", params=HORIZON_MODELS)
+def model(request):
+    with open(os.path.join(MODEL_DIR, f"{request.param}.pkl"), "rb") as f:
+        return pickle.load(f)
+
+
+def _sklearn_predict(model, X):
+    import pandas as pd
+    return model.predict(pd.DataFrame(X, columns=model.feature_names_in_))
+
+
+@pytest.mark.parametrize("n_rows", [1, 35, PREDICT_CHUNK_ROWS + 1, 2048])
+def test_flat_predict_matches_sklearn_exactly(model, n_rows):
+    X = probe_inputs(model, n_rows, seed=n_rows)
+    flat = FlatTreeEnsemble.from_sklearn(model)
+    np.testing.assert_array_equal(flat.predict(X), _sklearn_predict(model, X))
+
+
+def test_saved_file_predicts_like_sklearn(model, tmp_path):
+    X = probe_inputs(model, 512)
+    path = str(tmp_path / "model.flat")
+    FlatTreeEnsemble.from_sklearn(model).save(path)
+    np.testing.assert_array_equal(FlatTreeEnsemble.load(path).predict(X), _sklearn_predict(model, X))
+
+
+def test_predict_rejects_wrong_feature_count(model):
+    flat = FlatTreeEnsemble.from_sklearn(model)
+    with pytest.raises(ValueError):
+        flat.predict(np.zeros((2, flat.n_features + 1)))
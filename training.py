@@ -0,0 +1,275 @@
+import argparse
+import json
+import logging
+import os
+import pickle
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import GradientBoostingRegressor
+from sqlalchemy.orm import Session
+
+import config
+from backtest import error_metrics
+from features import FEATURE_COLUMNS, LAG_MONTHS, FeatureHistory, YearMonth, feature_matrix, shift_month
+from model_registry import HORIZON_MODELS, METADATA_FILE, list_versions, promote, read_metadata, registry, version_dir
+from models import Unit
+from predict import model_horizon, parse_model_names
+from tree_eval import export_model, flat_path_for
+
+logger = logging.getLogger(__name__)
+
+# hyperparameters ของโมเดลชุดเดิม (models/T*.pkl) ซึ่งปรับแยกตาม horizon ค่าที่ไม่ได้ระบุใช้ค่าเริ่มต้นของ sklearn
+GBR_PARAMS = {"learning_rate": 0.1, "loss": "squared_error"}
+HORIZON_PARAMS = {
+    "T1": {"n_estimators": 300, "max_depth": 5, "random_state": 11},
+    "T2": {"n_estimators": 300, "max_depth": 5, "random_state": 28},
+    "T3": {"n_estimators": 500, "max_depth": 3, "random_state": 18},
+    "T4": {"n_estimators": 400, "max_depth": 4, "random_state": 45},
+    "T5": {"n_estimators": 400, "max_depth": 6, "random_state": 24},
+    "T6": {"n_estimators": 500, "max_depth": 5, "random_state": 26},
+    "T7": {"n_estimators": 300, "max_depth": 5, "random_state": 46},
+    "T8": {"n_estimators": 500, "max_depth": 4, "random_state": 22},
+    "T9": {"n_estimators": 300, "max_depth": 4, "random_state": 46},
+    "T10": {"n_estimators": 500, "max_depth": 5, "random_state": 48},
+    "T11": {"n_estimators": 500, "max_depth": 5, "random_state": 35},
+    "T12": {"n_estimators": 500, "max_depth": 5, "random_state": 17},
+}
+# เดือนท้ายสุดของช่วง train ที่กันไว้วัดผล (โมเดลที่บันทึกจะ train ใหม่ด้วยข้อมูลทั้งหมด)
+VALIDATION_MONTHS = 12
+
+
+@dataclass
+class Dataset:
+    X: np.ndarray
+    anchor_index: np.ndarray
+    targets: Dict[int, np.ndarray]
+    start: YearMonth
+    end: YearMonth
+
+
+def _month_index(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+def default_window(db: Session) -> Tuple[YearMonth, YearMonth]:
+    # เริ่มหลังเดือนแรกที่มีข้อมูล 11 เดือน เพื่อให้ lag ครบทุกตัว
+    first = db.query(Unit.years, Unit.month).order_by(Unit.years, Unit.month).first()
+    last = db.query(Unit.years, Unit.month).order_by(Unit.years.desc(), Unit.month.desc()).first()
+    if first is None:
+        raise ValueError("The unit table is empty")
+    return shift_month(first[0], first[1], LAG_MONTHS), (last[0], last[1])
+
+
+def build_dataset(db: Session, start: YearMonth, end: YearMonth, horizons: List[int]) -> Dataset:
+    """Lag features for every (building, anchor) in [start, end) and the actual units h months later."""
+    history = FeatureHistory.load(db, shift_month(*start, -LAG_MONTHS), end)
+    end_index = _month_index(*end)
+
+    rows, anchors = [], []
+    anchor = start
+    while _month_index(*anchor) < end_index:
+        for building_id in history.buildings_with_unit(*anchor):
+            row = history.feature_row(building_id, *anchor)
+            if row is not None:
+                rows.append(row)
+                anchors.append(anchor)
+        anchor = shift_month(*anchor, 1)
+    if not rows:
+        raise ValueError("No training rows in the requested window")
+
+    targets = {}
+    for horizon in horizons:
+        values = []
+        for (year, month), row in zip(anchors, rows):
+            target = shift_month(year, month, horizon)
+            values.append(history.units.get((*target, row.building_id)) if _month_index(*target) <= end_index else None)
+        targets[horizon] = np.array(values, dtype=np.float64)
+    anchor_index = np.array([_month_index(*a) for a in anchors])
+    return Dataset(feature_matrix(rows), anchor_index, targets, start, end)
+
+
+def model_params(model_name: str) -> dict:
+    return {**GBR_PARAMS, **HORIZON_PARAMS[model_name]}
+
+
+def _fit_horizon(model_name: str, horizon: int, X: np.ndarray, y: np.ndarray, anchor_index: np.ndarray,
+                 validation_from: int) -> Tuple[str, GradientBoostingRegressor, dict]:
+    started = time.perf_counter()
+    frame = pd.DataFrame(X, columns=FEATURE_COLUMNS)
+    labelled = ~np.isnan(y)
+    # วัดผลแบบแบ่งตามเวลา: แถวที่เดือนเป้าหมายอยู่ในช่วง validation ไม่ถูกใช้ train
+    target_index = anchor_index + horizon
+    train = labelled & (target_index < validation_from)
+    validation = labelled & (target_index >= validation_from)
+
+    params = model_params(model_name)
+    info = {"horizon": horizon, "params": params, "n_train": int(labelled.sum()), "n_validation": int(validation.sum()),
+            "validation": None}
+    if train.any() and validation.any():
+        model = GradientBoostingRegressor(**params)
+        model.fit(frame[train], y[train])
+        errors = model.predict(frame[validation]) - y[validation]
+        info["validation"] = error_metrics(errors, y[validation])
+
+    model = GradientBoostingRegressor(**params)
+    model.fit(frame[labelled], y[labelled])
+    info["train_seconds"] = round(time.perf_counter() - started, 2)
+    return model_name, model, info
+
+
+def _carry_over(model_names: List[str]) -> Tuple[str, Dict[str, str]]:
+    # horizon ที่ไม่ได้ train รอบนี้คัดลอกจากเวอร์ชันที่ใช้พยากรณ์อยู่ ทุกเวอร์ชันจึงมีครบ T1-T12 และ promote ได้เสมอ
+    sources = {name: registry.path_for(name) for name in HORIZON_MODELS if name not in model_names}
+    missing = [path for path in sources.values() if not os.path.isfile(path)]
+    if missing:
+        raise FileNotFoundError(f"Cannot carry over models that are not trained in this run: {', '.join(missing)}")
+    return registry.serving_version(), sources
+
+
+def train(db: Session, start: Optional[YearMonth] = None, end: Optional[YearMonth] = None,
+          model_name: str = "All", workers: int = config.TRAIN_WORKERS) -> str:
+    """Train the horizon models in parallel and write them as a new (not yet promoted) version.
+
+    Horizons left out of ``model_name`` are copied from the serving version,
+    so every version holds T1-T12. Missing source files fail before training.
+    """
+    default_start, default_end = default_window(db)
+    start, end = start or default_start, end or default_end
+    model_names = parse_model_names(model_name)
+    source_version, carried = _carry_over(model_names)
+    horizons = [model_horizon(name, i + 1) for i, name in enumerate(model_names)]
+
+    started = time.perf_counter()
+    dataset = build_dataset(db, start, end, horizons)
+    validation_from = _month_index(*end) - VALIDATION_MONTHS + 1
+    logger.info("Training %s on %d rows (%d-%02d .. %d-%02d)", ",".join(model_names), len(dataset.X),
+                start[0], start[1], end[0], end[1])
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(workers, len(model_names))) as executor:
+        futures = [
+            executor.submit(_fit_horizon, name, horizon, dataset.X, dataset.targets[horizon],
+                            dataset.anchor_index, validation_from)
+            for name, horizon in zip(model_names, horizons)
+        ]
+        results = [future.result() for future in futures]
+
+    # ต่อท้ายด้วยค่าสุ่ม สองรอบที่เริ่มในวินาทีเดียวกันจึงไม่ใช้โฟลเดอร์ .tmp ร่วมกัน (สร้างด้วย exist_ok=False)
+    version = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    final_dir = version_dir(version)
+    tmp_dir = final_dir + ".tmp"
+    os.makedirs(os.path.dirname(tmp_dir), exist_ok=True)
+    os.makedirs(tmp_dir, exist_ok=False)
+    metadata = {
+        "version": version,
+        "created_at": datetime.now().isoformat(),
+        "sklearn_version": sklearn.__version__,
+        "feature_columns": FEATURE_COLUMNS,
+        "training_window": {"start": f"{start[0]}-{start[1]:02d}", "end": f"{end[0]}-{end[1]:02d}"},
+        "validation_months": VALIDATION_MONTHS,
+        "rows": int(len(dataset.X)),
+        "duration": round(time.perf_counter() - started, 2),
+        "models": {},
+    }
+    for name, model, info in results:
+        with open(os.path.join(tmp_dir, f"{name}.pkl"), "wb") as f:
+            pickle.dump(model, f)
+        # ไฟล์ .flat สำหรับ INFERENCE_BACKEND=flat (โหลดแบบ mmap ไม่ต้อง unpickle)
+        export_model(model, os.path.join(tmp_dir, f"{name}.flat"))
+        metadata["models"][name] = info
+    source_models = _source_metadata(source_version).get("models", {})
+    for name, path in carried.items():
+        shutil.copy2(path, os.path.join(tmp_dir, f"{name}.pkl"))
+        flat_path = flat_path_for(path)
+        if os.path.isfile(flat_path) and os.path.getmtime(flat_path) >= os.path.getmtime(path):
+            shutil.copy2(flat_path, os.path.join(tmp_dir, f"{name}.flat"))
+        metadata["models"][name] = {**source_models.get(name, {}), "carried_over_from": source_version}
+    metadata["models"] = {name: metadata["models"][name] for name in HORIZON_MODELS}
+    with open(os.path.join(tmp_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    # ย้ายทั้งโฟลเดอร์ทีเดียว เวอร์ชันที่เห็นใน versions/ จึงมีไฟล์ครบเสมอ
+    os.replace(tmp_dir, final_dir)
+    logger.info("Wrote model version %s in %.1fs", version, metadata["duration"])
+    return version
+
+
+def _source_metadata(version: str) -> dict:
+    # เวอร์ชัน base (models/T*.pkl เดิม) ไม่มี metadata.json
+    try:
+        return read_metadata(version)
+    except FileNotFoundError:
+        return {}
+
+
+def _parse_month(value: str) -> YearMonth:
+    year, month = value.split("-")
+    return int(year), int(month)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train and manage versioned horizon models")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train")
+    train_parser.add_argument("--start", type=_parse_month, help="first anchor month, YYYY-MM")
+    train_parser.add_argument("--end", type=_parse_month, help="last month with data, YYYY-MM")
+    train_parser.add_argument("--models", default="All")
+    train_parser.add_argument("--workers", type=int, default=config.TRAIN_WORKERS)
+    train_parser.add_argument("--promote", action="store_true")
+    promote_parser = commands.add_parser("promote")
+    promote_parser.add_argument("version", help="version to serve, or 'none' for models/T*.pkl")
+    commands.add_parser("list")
+    args = parser.parse_args(argv)
+
+    import logging_config
+
+    logging_config.setup_logging()
+
+    try:
+        return _run_command(args)
+    except FileNotFoundError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+
+def _run_command(args) -> int:
+    if args.command == "train":
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            # ตรวจไฟล์ของ horizon ที่ต้องคัดลอกก่อนเริ่ม train (เวอร์ชันที่ได้จึง promote ได้เสมอ)
+            version = train(db, args.start, args.end, args.models, args.workers)
+        finally:
+            db.close()
+        metadata = read_metadata(version)
+        print(f"version {version}: {metadata['rows']} rows in {metadata['duration']}s")
+        for name, info in metadata["models"].items():
+            if "carried_over_from" in info:
+                print(f"{name:>4}  copied from {info['carried_over_from']}")
+                continue
+            validation = info["validation"]
+            score = f"MAE={validation['mae']:.1f} RMSE={validation['rmse']:.1f}" if validation else "no validation data"
+            print(f"{name:>4}  n={info['n_train']:<6} {score}")
+        if args.promote:
+            promote(version)
+            print(f"promoted {version}")
+    elif args.command == "promote":
+        promote(None if args.version == "none" else args.version)
+    else:
+        for item in list_versions():
+            print(f"{'*' if item['active'] else ' '} {item['version']}  {item['training_window']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())